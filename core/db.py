@@ -0,0 +1,66 @@
+"""
+Database configuration. SQLite by default; set DB_ENGINE=postgresql and the
+DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT variables to use
+PostgreSQL instead.
+"""
+import os
+
+import django
+
+# Applied to every new SQLite connection by configure_connection(). WAL lets
+# report queries read while the till writes, NORMAL sync is safe with WAL,
+# and the busy timeout makes writers queue for the lock instead of failing
+# with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 20_000,
+}
+
+
+def database_config(base_dir, env=os.environ):
+    """Return the "default" DATABASES entry described by the environment."""
+    # Connections are kept open between requests and checked before reuse.
+    common = {
+        "CONN_MAX_AGE": int(env.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    engine = env.get("DB_ENGINE", "sqlite3")
+    if engine in ("postgresql", "postgres"):
+        return {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": env.get("DB_NAME", "canteensales"),
+            "USER": env.get("DB_USER", ""),
+            "PASSWORD": env.get("DB_PASSWORD", ""),
+            "HOST": env.get("DB_HOST", "localhost"),
+            "PORT": env.get("DB_PORT", "5432"),
+            **common,
+        }
+    if engine != "sqlite3":
+        raise ValueError(f"Unsupported DB_ENGINE {engine!r}.")
+
+    options = {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}
+    if django.VERSION >= (5, 1):
+        # Writers take the lock when their transaction starts. A deferred
+        # transaction that reads first and then writes can't wait for the
+        # lock and fails immediately instead.
+        options["transaction_mode"] = "IMMEDIATE"
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env.get("DB_NAME", base_dir / "db.sqlite3"),
+        "OPTIONS": options,
+        # A file rather than the in-memory default, so tests see the same
+        # WAL locking as production.
+        "TEST": {"NAME": env.get("DB_TEST_NAME", base_dir / "test_db.sqlite3")},
+        **common,
+    }
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 import os
 from pathlib import Path
 
+from core.db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'sales.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,10 +80,7 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 
@@ -123,3 +124,77 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache shared by the worker processes, through which they notice each
+# other's product catalog changes. With the per-process default every report
+# loads the product names afresh instead; point CACHE_BACKEND and CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379, or
+# django.core.cache.backends.filebased.FileBasedCache and a directory.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Reports
+# Most recently used (report, period) entries kept by the in-process report
+# cache before the oldest are evicted.
+REPORT_CACHE_MAX_ENTRIES = 256
+
+# Cache alias (from CACHES) memoizing the daily and monthly report rows, and
+# how long an entry is kept. Entries are checked against the database, so
+# any backend is safe; only a shared one lets workers reuse each other's rows
+# and lets manage.py report_memo_stats count across them.
+REPORT_MEMO_CACHE = 'default'
+REPORT_MEMO_TIMEOUT = 24 * 60 * 60
+
+# Where generated reports are kept. S3 by default; set REPORT_STORE_BACKEND to
+# sales.storage.LocalReportStore to keep them under REPORT_STORE_ROOT instead.
+REPORT_STORE = {
+    'BACKEND': os.getenv('REPORT_STORE_BACKEND', 'sales.storage.S3ReportStore'),
+    'OPTIONS': {},
+}
+if REPORT_STORE['BACKEND'] == 'sales.storage.LocalReportStore':
+    REPORT_STORE['OPTIONS']['root'] = os.getenv('REPORT_STORE_ROOT', BASE_DIR / 'reports')
+if REPORT_STORE['BACKEND'] == 'sales.storage.S3ReportStore' and os.getenv(
+    'AWS_S3_ENDPOINT_URL'
+):
+    # An S3 compatible server instead of AWS, e.g. MinIO.
+    REPORT_STORE['OPTIONS']['endpoint_url'] = os.getenv('AWS_S3_ENDPOINT_URL')
+
+# Threads the async views run blocking report store calls (uploads,
+# presigning) on, per process.
+REPORT_STORE_THREADS = int(os.getenv('REPORT_STORE_THREADS', 8))
+
+# Send report downloads straight to the store's presigned URL instead of
+# streaming them through the app. Either way only URLs into the configured
+# store are followed.
+REPORT_DOWNLOAD_REDIRECT = False
+
+# Build reports in background workers (manage.py run_report_workers) instead
+# of inside the request. Report POSTs then answer with a job to poll.
+REPORT_JOBS_ASYNC = os.getenv('REPORT_JOBS_ASYNC', '') == '1'
+
+# Profit engine for report files: "python" computes with Decimals row by row,
+# "numpy" with integer paise arrays (sales/vectorized.py). Both give the same
+# rows; numpy pays off on large catalogs.
+REPORT_ENGINE = os.getenv('REPORT_ENGINE', 'python')
+
+# Refuse sales (and reject imported lines) that would take more pieces than
+# the day's inventory has left, per the stock ledger in sales/stock.py.
+STOCK_PREVENT_OVERSELL = os.getenv('STOCK_PREVENT_OVERSELL', '') == '1'
+# Default ?threshold of the low-stock report.
+STOCK_LOW_THRESHOLD = 10
+
+# Where manage.py export_snapshot writes the columnar history snapshot.
+SNAPSHOT_ROOT = os.getenv('SNAPSHOT_ROOT', BASE_DIR / 'snapshots')
+
+# Request instrumentation (sales.instrumentation). This share of requests is
+# run under cProfile; profiles of those slower than REQUEST_PROFILE_SLOW_MS
+# are written to REQUEST_PROFILE_DIR.
+REQUEST_PROFILE_SAMPLE_RATE = float(os.getenv('REQUEST_PROFILE_SAMPLE_RATE', '0'))
+REQUEST_PROFILE_SLOW_MS = 1000
+REQUEST_PROFILE_DIR = BASE_DIR / 'profiles'
@@ -1,8 +1,146 @@
+from django import forms
 from django.contrib import admin
-from .models import Product,Inventory,Sales,Expenditure
-# Register your models here.
-admin.site.register(Product)
-admin.site.register(Inventory) 
-admin.site.register(Sales)
-admin.site.register(Expenditure)
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
 
+from .models import Expenditure, Inventory, Product, Sales, StockLevel
+from .stock import prevent_oversell, stock_level
+
+
+def table_row_estimate(model, using="default"):
+    """
+    Row count of `model`'s table from the database statistics, or None when
+    there are none: PostgreSQL's planner estimate, or SQLite's sqlite_stat1
+    once ANALYZE (or PRAGMA optimize) has run.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == "sqlite":
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 only exists after the first ANALYZE.
+        return None
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a whole large table. Unfiltered lists use
+    the table statistics; otherwise at most `max_count` rows are counted, so
+    pages past that are not linked until the filters narrow the list.
+    """
+
+    max_count = 10_000
+    # Whether more rows matched than were counted.
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = table_row_estimate(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.max_count:
+                return estimate
+        count = queryset.order_by().values("pk")[: self.max_count + 1].count()
+        self.capped = count > self.max_count
+        return min(count, self.max_count)
+
+    @property
+    def count_label(self):
+        """The count for display, e.g. "10,000+" when it was capped."""
+        count = self.count
+        return f"{count:,}+" if self.capped else str(count)
+
+
+class CheapCountAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the unfiltered COUNT(*) behind "N results (M total)".
+    show_full_result_count = False
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ("name",)
+    search_fields = ("name",)
+
+
+@admin.register(Inventory)
+class InventoryAdmin(CheapCountAdmin):
+    list_display = (
+        "date",
+        "product",
+        "total_pieces",
+        "cost_price_per_piece",
+        "selling_price_per_piece",
+    )
+    # __str__ and the product column would otherwise fetch every row's product.
+    list_select_related = ("product",)
+    # Both backed by the (date, product) and product_id indexes.
+    date_hierarchy = "date"
+    list_filter = ("product",)
+
+
+class SalesForm(forms.ModelForm):
+    class Meta:
+        model = Sales
+        fields = "__all__"
+
+    def clean(self):
+        # With STOCK_PREVENT_OVERSELL the save would raise Oversell; refuse
+        # it here so the admin shows an error instead.
+        cleaned_data = super().clean()
+        day = cleaned_data.get("date")
+        product = cleaned_data.get("product")
+        pieces = cleaned_data.get("pieces_sold")
+        if not prevent_oversell() or None in (day, product, pieces):
+            return cleaned_data
+        sale = self.instance
+        # Only the pieces added to the day's sales are checked, as in
+        # stock.take_stock().
+        if sale.pk is not None and (sale.date, sale.product_id) == (day, product.pk):
+            pieces -= sale.pieces_sold
+        remaining = stock_level(product.pk, day)[2]
+        if pieces > 0 and pieces > remaining:
+            self.add_error(
+                "pieces_sold",
+                ValidationError(f"Only {remaining} pieces left on {day}."),
+            )
+        return cleaned_data
+
+
+@admin.register(Sales)
+class SalesAdmin(CheapCountAdmin):
+    form = SalesForm
+    list_display = ("date", "product", "pieces_sold")
+    list_select_related = ("product",)
+    date_hierarchy = "date"
+    list_filter = ("product",)
+
+
+@admin.register(Expenditure)
+class ExpenditureAdmin(CheapCountAdmin):
+    list_display = ("date", "type", "amount_spent")
+    date_hierarchy = "date"
+
+
+@admin.register(StockLevel)
+class StockLevelAdmin(CheapCountAdmin):
+    list_display = ("date", "product", "stocked", "sold", "remaining")
+    list_select_related = ("product",)
+    date_hierarchy = "date"
+    list_filter = ("product",)
+    # Kept by sales.stock; fix drift with manage.py reconcile_stock.
+    readonly_fields = ("date", "product", "stocked", "sold", "remaining")
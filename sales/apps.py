@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from core.db import configure_connection
+
+        from . import signals  # noqa: F401
+
+        connection_created.connect(
+            configure_connection, dispatch_uid="core.db.configure_connection"
+        )
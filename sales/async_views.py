@@ -0,0 +1,287 @@
+"""
+Async versions of the report and download views for ASGI deployments. Report
+store calls (uploads, presigning) run on a bounded thread pool, concurrently
+where they don't depend on each other, and downloads are streamed with an
+async HTTP client so no thread is held while bytes are in flight.
+
+The report views answer with JSON rather than rendering the report pages:
+{"success": true, "download_url": ...} or {"success": false, "msg": ...}
+with an error status. Like any Django form POST they need a CSRF token.
+
+Streamed downloads need the httpx package; without it the download view
+answers 501 Not Implemented, and REPORT_DOWNLOAD_REDIRECT still works.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import unquote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_POST
+
+from .exports import EXPORT_FORMATS, export_report
+from .instrumentation import phase
+from .models import GeneratedReport
+from .report_cache import daily_fingerprint, monthly_fingerprint, report_cache
+from .storage import get_report_store
+from .views import (
+    DAILY_COLUMNS,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_TIMEOUT,
+    MONTHLY_COLUMNS,
+    copy_download_headers,
+    daily_report_key,
+    decode_presigned_url,
+    month_bounds,
+    monthly_report_key,
+    profit_functions,
+    record_generated_report,
+)
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_VIEW = "sales:async_download_excel"
+
+_store_pool = None
+
+
+def store_pool():
+    global _store_pool
+    if _store_pool is None:
+        _store_pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "REPORT_STORE_THREADS", 8),
+            thread_name_prefix="report-store",
+        )
+    return _store_pool
+
+
+async def in_store_pool(func, *args):
+    # The request context is copied so phase() timings still reach the
+    # request's metrics.
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        store_pool(), functools.partial(context.run, func, *args)
+    )
+
+
+async def build_report(
+    kind, period, export_format, fingerprint, calculate, columns, key
+):
+    """
+    Async views.build_report, returning (key, download URL), or (None, None)
+    when there is nothing to report. A new report is uploaded while its URL
+    is signed.
+    """
+    store = get_report_store()
+    cache_kind = f"{kind}.{export_format}"
+    stored = report_cache.get(cache_kind, period, fingerprint)
+    if stored is None:
+        stored = await (
+            GeneratedReport.objects.filter(
+                kind=kind,
+                period=period,
+                export_format=export_format,
+                fingerprint=fingerprint,
+            )
+            .values_list("report_key", flat=True)
+            .afirst()
+        )
+        if stored is not None:
+            report_cache.set(cache_kind, period, fingerprint, stored)
+    if stored is not None:
+        with phase("presign"):
+            download_url = await in_store_pool(
+                store.download_url, stored, DOWNLOAD_VIEW
+            )
+        return stored, download_url
+
+    with phase("aggregate"):
+        results = await sync_to_async(calculate)()
+    if results is None:
+        return None, None
+    with phase("export"):
+        report = await sync_to_async(export_report, thread_sensitive=False)(
+            results, columns, export_format
+        )
+
+    # Browsers may hold the previous file under its URL, so a fresh one is
+    # signed rather than taken from the URL cache.
+    if hasattr(store, "forget_url"):
+        store.forget_url(key)
+    with report, phase("upload"):
+        saved, download_url = await asyncio.gather(
+            in_store_pool(store.save, report, key),
+            in_store_pool(store.download_url, key, DOWNLOAD_VIEW),
+        )
+    if saved:
+        await sync_to_async(record_generated_report)(
+            kind, period, export_format, fingerprint, key
+        )
+        report_cache.set(cache_kind, period, fingerprint, key)
+    return key, download_url
+
+
+async def build_daily_report(date, export_format="xlsx"):
+    with phase("fingerprint"):
+        fingerprint = await sync_to_async(daily_fingerprint)(date)
+    return await build_report(
+        "daily",
+        date.isoformat(),
+        export_format,
+        fingerprint,
+        lambda: profit_functions()[0](date),
+        DAILY_COLUMNS,
+        daily_report_key(date, export_format),
+    )
+
+
+async def build_monthly_report(month, year, export_format="xlsx"):
+    start, end = month_bounds(month, year)
+    with phase("fingerprint"):
+        fingerprint = await sync_to_async(monthly_fingerprint)(start, end)
+    return await build_report(
+        "monthly",
+        f"{year}-{month:02d}",
+        export_format,
+        fingerprint,
+        lambda: profit_functions()[1](month, year),
+        MONTHLY_COLUMNS,
+        monthly_report_key(month, year, export_format),
+    )
+
+
+def report_json(key, download_url, missing):
+    if key is None:
+        return JsonResponse({"success": False, "msg": missing}, status=404)
+    if download_url is None:
+        return JsonResponse(
+            {"success": False, "msg": "unable to generate download url"}, status=502
+        )
+    return JsonResponse({"success": True, "download_url": download_url})
+
+
+@require_POST
+async def generate_daily_profit(request):
+    """Build the report for date=YYYY-MM-DD in `format` (xlsx by default)."""
+    try:
+        date = datetime.strptime(request.POST.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid date format."}, status=400
+        )
+    export_format = request.POST.get("format", "xlsx")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse(
+            {"success": False, "msg": f"Unsupported format {export_format}."},
+            status=400,
+        )
+    key, download_url = await build_daily_report(date, export_format)
+    return report_json(key, download_url, f"No sales on {date}.")
+
+
+@require_POST
+async def generate_monthly_profit(request):
+    """Build the report for month=M&year=YYYY in `format` (xlsx by default)."""
+    try:
+        month = int(request.POST.get("month", ""))
+        year = int(request.POST.get("year", ""))
+        month_bounds(month, year)
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid month or year format."}, status=400
+        )
+    export_format = request.POST.get("format", "xlsx")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse(
+            {"success": False, "msg": f"Unsupported format {export_format}."},
+            status=400,
+        )
+    key, download_url = await build_monthly_report(month, year, export_format)
+    return report_json(key, download_url, f"No sales in {year}-{month:02d}.")
+
+
+_download_clients = weakref.WeakKeyDictionary()
+
+
+def get_download_client():
+    # One pooled client per event loop; httpx connections can't be shared
+    # between loops.
+    loop = asyncio.get_running_loop()
+    client = _download_clients.get(loop)
+    if client is None:
+        import httpx
+
+        connect, read = DOWNLOAD_TIMEOUT
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=16),
+        )
+        _download_clients[loop] = client
+    return client
+
+
+async def stream_download(upstream):
+    try:
+        async for chunk in upstream.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+async def download_excel(request):
+    presigned_url = unquote(request.GET.get("presigned_url", ""))
+    try:
+        decoded_presigned_url, parsed_url = decode_presigned_url(presigned_url)
+        if not get_report_store().serves_url(decoded_presigned_url):
+            return HttpResponse("Not a report download URL.", status=400)
+        if getattr(settings, "REPORT_DOWNLOAD_REDIRECT", False):
+            return HttpResponseRedirect(decoded_presigned_url)
+
+        try:
+            client = get_download_client()
+        except ImportError:
+            logger.error("Streaming report downloads need the httpx package.")
+            return HttpResponse(
+                "Report downloads are not available on this server.", status=501
+            )
+        headers = {}
+        if "HTTP_RANGE" in request.META:
+            headers["Range"] = request.META["HTTP_RANGE"]
+        upstream = await client.send(
+            client.build_request("GET", decoded_presigned_url, headers=headers),
+            stream=True,
+        )
+        if upstream.status_code not in (200, 206):
+            logger.error(
+                "Error downloading report: status %s, headers %s",
+                upstream.status_code,
+                upstream.headers,
+            )
+            await upstream.aclose()
+            return HttpResponse(
+                f"Error downloading file. Status code: {upstream.status_code}",
+                status=500,
+            )
+        response = StreamingHttpResponse(
+            stream_download(upstream),
+            status=upstream.status_code,
+            content_type=upstream.headers.get(
+                "Content-Type", "application/octet-stream"
+            ),
+        )
+        copy_download_headers(upstream.headers, response, parsed_url)
+        return response
+    except Exception as e:
+        return HttpResponse(f"Error downloading file: {e}", status=500)
@@ -0,0 +1,616 @@
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from .catalog import invalidate_catalog
+from .ingest import import_sales, read_rows
+from .memo import invalidate_reports
+from .models import Expenditure, GeneratedReport, Inventory, Product, Sales
+from .report_cache import report_cache
+from .rollups import BATCH_SIZE, rebuild_summaries
+from .stock import reconcile_stock
+
+# Reports are kept in memory so the numbers measure the app, not the network.
+OFFLINE_STORE = {"BACKEND": "sales.storage.InMemoryReportStore"}
+EXPENDITURE_TYPES = ("gas", "milk", "vegetables", "cleaning", "wages")
+
+
+def seed(
+    products=20,
+    days=31,
+    sales_per_day=None,
+    expenditures_per_day=1,
+    start=date(2024, 1, 1),
+    random_seed=0,
+):
+    """
+    Fill the database with deterministic synthetic trading from `start`:
+    a daily inventory row for every product, `sales_per_day` sales spread
+    over the catalog (one per product by default) and `expenditures_per_day`
+    expenses. The same arguments always produce the same rows.
+    """
+    rng = random.Random(random_seed)
+    catalog = Product.objects.bulk_create(
+        Product(name=f"product-{i}") for i in range(products)
+    )
+    costs = [Decimal(rng.randint(500, 5000)).scaleb(-2) for _ in catalog]
+    margins = [Decimal(rng.randint(100, 1500)).scaleb(-2) for _ in catalog]
+    dates = [start + timedelta(days=day) for day in range(days)]
+    if sales_per_day is None:
+        sales_per_day = products
+
+    Inventory.objects.bulk_create(
+        (
+            Inventory(
+                date=day,
+                product=product,
+                total_pieces=rng.randint(50, 500),
+                cost_price_per_piece=cost,
+                selling_price_per_piece=cost + margin,
+            )
+            for day in dates
+            for product, cost, margin in zip(catalog, costs, margins)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Sales.objects.bulk_create(
+        (
+            Sales(
+                date=day,
+                # Every product sells once a day, further sales are random.
+                product=catalog[i] if i < products else rng.choice(catalog),
+                pieces_sold=rng.randint(1, 9),
+            )
+            for day in dates
+            for i in range(sales_per_day)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Expenditure.objects.bulk_create(
+        (
+            Expenditure(
+                date=day,
+                type=rng.choice(EXPENDITURE_TYPES),
+                amount_spent=Decimal(rng.randint(1000, 20000)).scaleb(-2),
+            )
+            for day in dates
+            for _ in range(expenditures_per_day)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create skips the signals that maintain the catalog, the rollups,
+    # the stock ledger and the memoized reports.
+    invalidate_catalog()
+    invalidate_reports()
+    rebuild_summaries()
+    reconcile_stock()
+    return start
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "iterations": len(timings),
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        # Nearest rank: the smallest timing at least 95% of them don't exceed.
+        "p95_ms": round(timings[math.ceil(0.95 * len(timings)) - 1], 3),
+    }
+
+
+def time_request(client, url, data, iterations, cold):
+    timings = []
+    for _ in range(iterations):
+        if cold:
+            report_cache.clear()
+            invalidate_reports()
+            GeneratedReport.objects.all().delete()
+        started = time.perf_counter()
+        response = client.post(url, data)
+        timings.append((time.perf_counter() - started) * 1000)
+        if not response.context or not response.context.get("success"):
+            raise RuntimeError(f"{url} failed: {response.content[:200]!r}")
+    return summarize(timings)
+
+
+def report_latency(iterations=20, products=20, days=31):
+    """
+    Time the daily and monthly report views end to end, cold (report built
+    and stored) and warm (served from the report cache).
+    """
+    results = {}
+    with override_settings(REPORT_STORE=OFFLINE_STORE):
+        start = seed(products=products, days=days)
+        client = Client()
+        scenarios = [
+            ("daily", "sales:generate_daily_profit", {"date": start.isoformat()}),
+            (
+                "monthly",
+                "sales:generate_monthly_profit",
+                {"month": start.month, "year": start.year},
+            ),
+        ]
+        for name, url_name, data in scenarios:
+            url = reverse(url_name)
+            results[f"{name}_cold"] = time_request(client, url, data, iterations, True)
+            results[f"{name}_warm"] = time_request(client, url, data, iterations, False)
+    return results
+
+
+def measure(run, iterations):
+    """
+    Time `run` over `iterations` calls, then call it once more under
+    tracemalloc and query capture, so tracing doesn't skew the timings.
+    """
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    stats = summarize(timings)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    stats["queries"] = len(queries)
+    stats["peak_kb"] = round(peak / 1024, 1)
+    return stats
+
+
+def report_suite(iterations=10, products=20, days=31, sales_per_day=None):
+    """
+    Seed synthetic data and measure the report scenarios: building the daily
+    and monthly reports from scratch, exporting the month to Excel and
+    downloading the stored file. Returns {scenario: stats} with wall time,
+    query count and peak traced memory.
+    """
+    from .exports import export_report
+    from .views import MONTHLY_COLUMNS, calculate_actual_profit_for_month
+
+    results = {}
+    with override_settings(REPORT_STORE=OFFLINE_STORE):
+        start = seed(products=products, days=days, sales_per_day=sales_per_day)
+        client = Client()
+
+        def post(url_name, data):
+            def run():
+                report_cache.clear()
+                invalidate_reports()
+                GeneratedReport.objects.all().delete()
+                response = client.post(reverse(url_name), data)
+                if not response.context or not response.context.get("success"):
+                    raise RuntimeError(f"{url_name} failed: {response.content[:200]!r}")
+                return response
+
+            return run
+
+        daily = post("sales:generate_daily_profit", {"date": start.isoformat()})
+        monthly = post(
+            "sales:generate_monthly_profit", {"month": start.month, "year": start.year}
+        )
+        results["daily_report"] = measure(daily, iterations)
+        results["monthly_report"] = measure(monthly, iterations)
+
+        rows = calculate_actual_profit_for_month(start.month, start.year)
+        results["excel_export"] = measure(
+            lambda: export_report(rows, MONTHLY_COLUMNS, "xlsx").close(), iterations
+        )
+
+        download_url = monthly().context["download_url"]
+
+        def download():
+            response = client.get(download_url)
+            if response.status_code != 200:
+                raise RuntimeError(f"Download failed with {response.status_code}")
+            # Consuming the stream closes the response.
+            for _ in response.streaming_content:
+                pass
+
+        results["download"] = measure(download, iterations)
+    return results
+
+
+# Metrics compared against a baseline; lower is better for all of them. The
+# fastest run is compared rather than the median as it is the least noisy.
+BASELINE_METRICS = ("min_ms", "queries", "peak_kb")
+
+
+def save_baseline(path, results, **meta):
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "scenarios": results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Return (scenario, metric, baseline value, current value) for every metric
+    that grew by more than `tolerance` over the baseline. Query counts must
+    not grow at all.
+    """
+    regressions = []
+    for scenario, stats in results.items():
+        previous = baseline["scenarios"].get(scenario)
+        if previous is None:
+            continue
+        for metric in BASELINE_METRICS:
+            if metric not in stats or metric not in previous:
+                continue
+            allowed = previous[metric] * (1 if metric == "queries" else 1 + tolerance)
+            if stats[metric] > allowed:
+                regressions.append((scenario, metric, previous[metric], stats[metric]))
+    return regressions
+
+
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import resolve
+resolve("/reports/")
+print(json.dumps(time.perf_counter() - started))
+"""
+
+
+def startup_time(iterations=5):
+    """
+    Time django.setup() plus loading the URLconf in fresh interpreters, as
+    every server and worker process pays it on start.
+    """
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "core.settings"
+        ),
+    }
+    timings = []
+    for _ in range(iterations):
+        completed = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(json.loads(completed.stdout.splitlines()[-1]) * 1000)
+    return {"startup": summarize(timings)}
+
+
+def ingest_throughput(rows=20_000, batch_sizes=(100, 1000, 5000), products=20):
+    """
+    Import `rows` CSV sales once per batch size and report rows per second,
+    including the rollup refresh each batch pays for.
+    """
+    catalog = Product.objects.bulk_create(
+        Product(name=f"ingest-{i}") for i in range(products)
+    )
+    start = date(2024, 1, 1)
+    Inventory.objects.bulk_create(
+        Inventory(
+            date=start,
+            product=product,
+            total_pieces=500,
+            cost_price_per_piece=Decimal("10.00"),
+            selling_price_per_piece=Decimal("14.00"),
+        )
+        for product in catalog
+    )
+    invalidate_catalog()
+    invalidate_reports()
+    results = {}
+    for run, batch_size in enumerate(batch_sizes):
+        # Each run writes a fresh year so every batch size inserts new rollups.
+        first_day = start.replace(year=start.year + run)
+        lines = ["date,product,pieces_sold"]
+        lines.extend(
+            f"{first_day + timedelta(days=i // products % 365)},"
+            f"ingest-{i % products},{i % 9 + 1}"
+            for i in range(rows)
+        )
+        body = "\n".join(lines).encode()
+
+        started = time.perf_counter()
+        batches = list(import_sales(read_rows(io.BytesIO(body), "csv"), batch_size))
+        elapsed = time.perf_counter() - started
+        inserted = sum(batch["inserted"] for batch in batches)
+        if inserted != rows:
+            raise RuntimeError(f"Imported {inserted} of {rows} rows.")
+        results[f"ingest_batch_{batch_size}"] = {
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed),
+        }
+    return results
+
+
+def engine_comparison(sizes=(100, 10_000, 1_000_000), iterations=3):
+    """
+    Time the Decimal (views.daily_rows) and integer paise array
+    (vectorized.daily_rows) daily report kernels on the same synthetic rows,
+    already fetched, so only the computation is measured.
+    """
+    from . import vectorized
+    from .views import daily_rows
+
+    day = date(2024, 1, 1)
+    results = {}
+    for size in sizes:
+        paise_records = [
+            (f"product-{i}", 500, 1000 + i % 700, 1400 + i % 700, i % 9 + 1)
+            for i in range(size)
+        ]
+        decimal_records = [
+            (name, pieces, Decimal(cost).scaleb(-2), Decimal(selling).scaleb(-2), sold)
+            for name, pieces, cost, selling, sold in paise_records
+        ]
+        arrays = vectorized.columns(paise_records, 5)
+        del paise_records
+
+        timings = {}
+        totals = {}
+        for engine, run in [
+            ("python", lambda: daily_rows(decimal_records, day)),
+            ("numpy", lambda: vectorized.daily_rows(*arrays, day)),
+        ]:
+            best = None
+            for _ in range(iterations):
+                started = time.perf_counter()
+                rows = run()
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[engine] = best
+            totals[engine] = rows[-1]
+            del rows
+        if totals["python"] != totals["numpy"]:
+            raise RuntimeError(f"Engines disagree at {size} rows.")
+        results[f"engine_{size}"] = {
+            "rows": size,
+            "python_ms": round(timings["python"], 3),
+            "numpy_ms": round(timings["numpy"], 3),
+            "speedup": round(timings["python"] / timings["numpy"], 2),
+        }
+    return results
+
+
+class S3StandIn(BaseHTTPRequestHandler):
+    """
+    Path style S3 stand-in keeping objects in the server's `objects` dict:
+    PUT, GET (with single byte ranges) and HEAD. Signatures are not checked.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.objects[self.path.split("?")[0]] = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("ETag", '"stand-in"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        data = self.server.objects.get(self.path.split("?")[0])
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status, first, last = 200, 0, len(data) - 1
+        if "Range" in self.headers:
+            start, _, end = self.headers["Range"].removeprefix("bytes=").partition("-")
+            status, first, last = 206, int(start), int(end or len(data) - 1)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        self.end_headers()
+        if body:
+            self.wfile.write(data[first : last + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+def start_s3_stand_in():
+    """Serve an S3StandIn in a thread; returns (server, endpoint URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), S3StandIn)
+    server.daemon_threads = True
+    server.objects = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# How each server is started and which views it is benchmarked through.
+SERVERS = {
+    "asgi": (
+        ["-m", "uvicorn", "core.asgi:application", "--log-level", "warning"],
+        ["--host", "127.0.0.1", "--port", "{port}"],
+        ("sales:async_generate_daily_profit", "sales:async_download_excel"),
+    ),
+    "wsgi": (
+        ["manage.py", "runserver", "--noreload"],
+        ["127.0.0.1:{port}"],
+        ("sales:generate_daily_profit", "sales:download_excel"),
+    ),
+}
+
+
+def start_server(name, env, timeout=30):
+    command, address, _ = SERVERS[name]
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, *command, *(arg.format(port=port) for arg in address)],
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urlopen(f"{base_url}/", timeout=1).close()
+            return process, base_url
+        except HTTPError:
+            # Answering at all means it is up.
+            return process, base_url
+        except (URLError, ConnectionError):
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"The {name} server did not start.")
+
+
+def load(send, count, concurrency):
+    """
+    Call `send(session, i)` `count` times from `concurrency` threads, each
+    with its own requests session; `send` returns whether the call worked.
+    """
+    import requests
+
+    local = threading.local()
+
+    def run(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        ok = send(local.session, i)
+        return ok, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(run, range(count)))
+    elapsed = time.perf_counter() - started
+    stats = summarize([ms for _, ms in outcomes])
+    stats.update(
+        seconds=round(elapsed, 3),
+        requests_per_sec=round(count / elapsed, 1),
+        errors=sum(1 for ok, _ in outcomes if not ok),
+    )
+    return stats
+
+
+def server_throughput(
+    requests=200, concurrency=16, products=20, days=31, file_kb=1024
+):
+    """
+    Requests per second for report and download traffic under uvicorn with
+    the async views and under the threaded WSGI development server with the
+    sync views, both backed by a local S3 stand-in. Reports cycle over the
+    seeded days, so after the first pass they are served from the report
+    caches; downloads proxy a `file_kb` KiB object. Needs uvicorn and httpx.
+    """
+    missing = [
+        module
+        for module in ("uvicorn", "httpx")
+        if importlib.util.find_spec(module) is None
+    ]
+    if missing:
+        raise RuntimeError(f"server_throughput needs {', '.join(missing)}.")
+
+    start = seed(products=products, days=days)
+    s3, endpoint = start_s3_stand_in()
+    s3.objects["/canteensales/benchmark.xlsx"] = b"x" * (file_kb * 1024)
+    presigned_url = f"{endpoint}/canteensales/benchmark.xlsx?X-Amz-Signature=stand-in"
+    # The async report views check CSRF like a form would.
+    csrf_token = get_random_string(32)
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "core.settings"
+        ),
+        # The servers read the database this process seeded.
+        "DB_NAME": str(connection.settings_dict["NAME"]),
+        "REPORT_STORE_BACKEND": "sales.storage.S3ReportStore",
+        "AWS_S3_ENDPOINT_URL": endpoint,
+        "AWS_ACCESS_KEY_ID": "stand-in",
+        "AWS_SECRET_ACCESS_KEY": "stand-in",
+    }
+
+    results = {}
+    try:
+        for name, (_, _, (report_view, download_view)) in SERVERS.items():
+            process, base_url = start_server(name, env)
+            try:
+                report_url = base_url + reverse(report_view)
+                download_url = (
+                    f"{base_url}{reverse(download_view)}?"
+                    f"{urlencode({'presigned_url': presigned_url})}"
+                )
+
+                def report(session, i):
+                    day = start + timedelta(days=i % days)
+                    response = session.post(
+                        report_url,
+                        {"date": day.isoformat()},
+                        cookies={"csrftoken": csrf_token},
+                        headers={"X-CSRFToken": csrf_token},
+                    )
+                    # The sync view answers errors with 200 too; both link
+                    # the download on success.
+                    return (
+                        response.status_code == 200
+                        and "presigned_url" in response.text
+                    )
+
+                def download(session, i):
+                    with session.get(download_url, stream=True) as response:
+                        received = sum(map(len, response.iter_content(65536)))
+                    return received == file_kb * 1024
+
+                results[f"{name}_report"] = load(report, requests, concurrency)
+                results[f"{name}_download"] = load(download, requests, concurrency)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        s3.shutdown()
+        s3.server_close()
+    return results
@@ -0,0 +1,97 @@
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+
+from .memo import is_process_local
+from .models import Product
+
+# Shared cache key holding the current catalog version. Any process that
+# changes products replaces it, and every process reloads its catalog when the
+# version it loaded no longer matches. A process-local default cache can't
+# carry the version between workers, so the catalog is then loaded afresh on
+# every use instead.
+CATALOG_VERSION_KEY = "sales:catalog:version"
+
+
+class Catalog:
+    """Every product's name, keyed by id."""
+
+    def __init__(self, version, products):
+        self.version = version
+        self.names = dict(products)
+        # Later products win on duplicate names, as with a dict built from
+        # the same queryset.
+        self.ids_by_name = {name: product_id for product_id, name in products}
+
+    def __contains__(self, product_id):
+        return product_id in self.names
+
+    def name(self, product_id):
+        return self.names[product_id]
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def load_catalog(version):
+    """Load the catalog in one query."""
+    return Catalog(
+        version, list(Product.objects.order_by("pk").values_list("pk", "name"))
+    )
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # add() so processes racing after an eviction agree on one version.
+        cache.add(CATALOG_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog(product_ids=()):
+    """
+    Return this process's catalog, reloading it when another process changed
+    the products since it was loaded or when any of `product_ids` is missing.
+    With a process-local default cache every call loads it from the database.
+    """
+    global _catalog
+    if is_process_local(caches["default"]):
+        return load_catalog(None)
+    version = catalog_version()
+    catalog = _catalog
+    if (
+        catalog is None
+        or catalog.version != version
+        or any(product_id not in catalog for product_id in product_ids)
+    ):
+        with _lock:
+            catalog = _catalog = load_catalog(version)
+    return catalog
+
+
+def product_names(records):
+    """
+    Replace the product id leading each record with the product's name, so
+    report queries need no join on the product table.
+    """
+    records = list(records)
+    catalog = get_catalog({record[0] for record in records})
+    return [(catalog.name(product_id), *rest) for product_id, *rest in records]
+
+
+def invalidate_catalog():
+    """
+    Make every process reload its catalog. Called by the Product signals;
+    call it after bulk writes, which skip them.
+    """
+    cache.set(CATALOG_VERSION_KEY, uuid4().hex, None)
+    if connection.in_atomic_block:
+        # Again once the change is visible, in case a process reloaded
+        # before the commit.
+        transaction.on_commit(
+            lambda: cache.set(CATALOG_VERSION_KEY, uuid4().hex, None)
+        )
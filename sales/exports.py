@@ -0,0 +1,101 @@
+import codecs
+import csv
+import tempfile
+
+from django.conf import settings
+
+# Reports stay in memory up to this size and spill to an anonymous temporary
+# file beyond it, so exporting a long range never holds the whole file in RAM.
+SPOOL_MAX_SIZE = getattr(settings, "REPORT_EXPORT_SPOOL_BYTES", 8 * 1024 * 1024)
+PARQUET_BATCH_SIZE = 10_000
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def write_xlsx(rows, columns, fileobj):
+    # Write-only workbooks serialize each row as it is appended instead of
+    # keeping the whole sheet as cell objects.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([row.get(column) for column in columns])
+    workbook.save(fileobj)
+
+
+def write_csv(rows, columns, fileobj):
+    writer = csv.DictWriter(
+        codecs.getwriter("utf-8")(fileobj), fieldnames=columns, extrasaction="ignore"
+    )
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_parquet(rows, columns, fileobj):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs the pyarrow package.")
+
+    writer = None
+    batch = []
+
+    def flush():
+        nonlocal writer
+        if writer is None:
+            table = pa.Table.from_pylist(batch).select(columns)
+            # Money columns are inferred with just enough precision for the
+            # first batch; widen them so later batches fit the same schema.
+            schema = pa.schema(
+                pa.field(field.name, pa.decimal128(18, field.type.scale))
+                if pa.types.is_decimal(field.type)
+                else field
+                for field in table.schema
+            )
+            writer = pq.ParquetWriter(fileobj, schema)
+        table = pa.Table.from_pylist(batch, schema=writer.schema)
+        writer.write_table(table)
+        batch.clear()
+
+    for row in rows:
+        batch.append({column: row.get(column) for column in columns})
+        if len(batch) >= PARQUET_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    if writer is None:
+        raise ValueError("There are no rows to export.")
+    writer.close()
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_report(rows, columns, export_format="xlsx"):
+    """
+    Stream `rows` (an iterable of dicts) into a report file in the given
+    format and return it as a binary file object positioned at the start.
+    Keys missing from a row are written as empty cells.
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"Unsupported export format {export_format!r}.")
+    fileobj = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    WRITERS[export_format](rows, columns, fileobj)
+    fileobj.seek(0)
+    return fileobj
+
+
+def render_report(rows, columns, export_format="xlsx"):
+    """
+    Return the bytes of a report file. Only needs settings, not the app
+    registry, so it can run in a freshly spawned worker process.
+    """
+    with export_report(rows, columns, export_format) as report:
+        return report.read()
@@ -0,0 +1,105 @@
+import codecs
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from django.db import transaction
+
+from .catalog import get_catalog
+from .models import Sales
+from .rollups import refresh_summaries
+from .stock import take_stock
+
+DEFAULT_BATCH_SIZE = 1000
+INGEST_FORMATS = ("csv", "jsonl")
+
+
+def read_rows(stream, ingest_format):
+    """
+    Yield (line_number, row dict) pairs from a binary CSV or JSON lines
+    stream. Each row needs "date" (YYYY-MM-DD), "product" (the product name)
+    and "pieces_sold".
+    """
+    lines = codecs.iterdecode(stream, "utf-8")
+    if ingest_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif ingest_format == "jsonl":
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # Reported against its line like any other invalid row.
+                row = None
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format {ingest_format!r}.")
+
+
+def build_sale(row, product_ids):
+    if not isinstance(row, dict):
+        raise ValueError("Row is not a JSON object")
+    name = row.get("product")
+    if name not in product_ids:
+        raise ValueError(f"Unknown product {name!r}")
+    pieces_sold = int(row["pieces_sold"])
+    if pieces_sold < 0:
+        raise ValueError("pieces_sold must not be negative")
+    return Sales(
+        date=datetime.strptime(row["date"], "%Y-%m-%d").date(),
+        product_id=product_ids[name],
+        pieces_sold=pieces_sold,
+    )
+
+
+def import_sales(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert (line_number, row) pairs as Sales in batches of `batch_size`, one
+    transaction per batch. Invalid rows are skipped and reported. Yields a
+    result dict for each batch once it is committed.
+    """
+    # Product names are resolved from the catalog instead of a query per row.
+    product_ids = get_catalog().ids_by_name
+    rows = iter(rows)
+    number = 0
+    while batch := list(islice(rows, batch_size)):
+        sales, errors = [], []
+        for line_number, row in batch:
+            try:
+                sales.append((line_number, build_sale(row, product_ids)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append({"line": line_number, "error": str(e)})
+        with transaction.atomic():
+            # bulk_create skips the signals that keep the stock ledger and
+            # the rollups current.
+            changes = Counter()
+            for _, sale in sales:
+                changes[(sale.date, sale.product_id)] += sale.pieces_sold
+            short = take_stock(changes)
+            if short:
+                # Every sale of a product and day that would oversell is
+                # rejected; the rest of the batch goes in.
+                kept = []
+                for line_number, sale in sales:
+                    remaining = short.get((sale.date, sale.product_id))
+                    if remaining is None:
+                        kept.append((line_number, sale))
+                        continue
+                    errors.append(
+                        {
+                            "line": line_number,
+                            "error": f"Only {remaining} pieces left on {sale.date}",
+                        }
+                    )
+                errors.sort(key=lambda error: error["line"])
+                sales = kept
+            sales = [sale for _, sale in sales]
+            Sales.objects.bulk_create(sales)
+            refresh_summaries((sale.date, sale.product_id) for sale in sales)
+        number += 1
+        yield {"batch": number, "inserted": len(sales), "errors": errors}
@@ -0,0 +1,195 @@
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("sales.requests")
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+_phase_listener = contextvars.ContextVar("phase_listener", default=None)
+
+
+class RequestMetrics:
+    """Query and phase timings collected while one request is handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+        self.phases = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the request.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_ms += (time.perf_counter() - started) * 1000
+
+    def add_phase(self, name, elapsed_ms):
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+
+    def install(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.append(self)
+
+    def uninstall(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.remove(self)
+
+    def server_timing(self, total_ms):
+        entries = [f'db;dur={self.query_ms:.1f};desc="{self.queries} queries"']
+        entries.extend(f"{name};dur={ms:.1f}" for name, ms in self.phases.items())
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a named step of the current request, such as "aggregate" or
+    "upload". Outside a request, e.g. in report workers, nothing is recorded.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add_phase(name, (time.perf_counter() - started) * 1000)
+    listener = _phase_listener.get()
+    if listener is not None:
+        listener(name)
+
+
+@contextmanager
+def phase_listener(callback):
+    """Call `callback(name)` as each phase of the block completes."""
+    token = _phase_listener.set(callback)
+    try:
+        yield
+    finally:
+        _phase_listener.reset(token)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else None
+
+
+def start_profiler():
+    # A sampled share of requests is profiled; the profile is only kept if
+    # the request turns out slow.
+    if random.random() >= getattr(settings, "REQUEST_PROFILE_SAMPLE_RATE", 0):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this process.
+        return None
+    return profiler
+
+
+def dump_profile(profiler, request, total_ms):
+    directory = getattr(settings, "REQUEST_PROFILE_DIR", None) or str(
+        settings.BASE_DIR / "profiles"
+    )
+    os.makedirs(directory, exist_ok=True)
+    view = (view_name(request) or "unknown").replace(":", ".")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{stamp}-{view}-{total_ms:.0f}ms.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+class InstrumentationMiddleware:
+    """
+    Counts and times every query a request runs, collects phase() timings,
+    and reports them in a Server-Timing header and one structured log line
+    per request. Requests sampled by REQUEST_PROFILE_SAMPLE_RATE run under
+    cProfile and are dumped to REQUEST_PROFILE_DIR when slower than
+    REQUEST_PROFILE_SLOW_MS.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        profiler = start_profiler()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            total_ms = (time.perf_counter() - started) * 1000
+            if profiler is not None:
+                profiler.disable()
+            _current.reset(token)
+        return self.finish(request, response, metrics, total_ms, profiler)
+
+    async def __acall__(self, request):
+        # Under ASGI, sync views and the async ORM run their queries in the
+        # request's thread sensitive worker thread, so the wrapper goes on
+        # that thread's connections. cProfile only sees the event loop
+        # thread, so async requests are not profiled.
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        await sync_to_async(metrics.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(metrics.uninstall)()
+            total_ms = (time.perf_counter() - started) * 1000
+            _current.reset(token)
+        return self.finish(request, response, metrics, total_ms, None)
+
+    def finish(self, request, response, metrics, total_ms, profiler):
+        response["Server-Timing"] = metrics.server_timing(total_ms)
+        profile = None
+        if profiler is not None and total_ms >= getattr(
+            settings, "REQUEST_PROFILE_SLOW_MS", 1000
+        ):
+            profile = dump_profile(profiler, request, total_ms)
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "view": view_name(request),
+                    "status": response.status_code,
+                    "duration_ms": round(total_ms, 1),
+                    "queries": metrics.queries,
+                    "db_ms": round(metrics.query_ms, 1),
+                    "phases": {
+                        name: round(ms, 1) for name, ms in metrics.phases.items()
+                    },
+                    "profile": profile,
+                }
+            )
+        )
+        return response
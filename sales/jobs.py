@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .instrumentation import phase_listener
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# Jobs still marked running after this long are assumed to belong to a worker
+# that died, and are queued again.
+STALE_JOB_AGE = timedelta(minutes=15)
+
+# Progress of a running job once each step of the build is done: claimed
+# jobs aggregate, then export, then upload.
+PHASE_PROGRESS = {"aggregate": 60, "export": 90}
+
+
+def enqueue_report(kind, period, export_format="xlsx"):
+    """
+    Queue a report build, or return the queued or running job already
+    building the same report.
+    """
+    lookup = {"kind": kind, "period": period, "export_format": export_format}
+    active = ReportJob.objects.filter(
+        status__in=ReportJob.ACTIVE_STATUSES, **lookup
+    ).first()
+    if active is not None:
+        return active
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(**lookup)
+    except IntegrityError:
+        # Another request queued it between our lookup and insert.
+        return ReportJob.objects.get(status__in=ReportJob.ACTIVE_STATUSES, **lookup)
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running and return it."""
+    candidates = (
+        ReportJob.objects.filter(status=ReportJob.QUEUED)
+        .order_by("created_at", "pk")
+        .values_list("pk", flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.QUEUED).update(
+            status=ReportJob.RUNNING, progress=10, updated_at=timezone.now()
+        )
+        if claimed:
+            return ReportJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stale_jobs(older_than=STALE_JOB_AGE):
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, updated_at__lt=timezone.now() - older_than
+    ).update(status=ReportJob.QUEUED, progress=0, updated_at=timezone.now())
+
+
+def build_report(job):
+    # Imported here because the views enqueue jobs themselves.
+    from .views import build_daily_report, build_monthly_report
+
+    if job.kind == "daily":
+        day = datetime.strptime(job.period, "%Y-%m-%d").date()
+        return build_daily_report(day, job.export_format)
+    if job.kind == "monthly":
+        month_start = datetime.strptime(job.period, "%Y-%m")
+        return build_monthly_report(
+            month_start.month, month_start.year, job.export_format
+        )
+    raise ValueError(f"Unknown report kind {job.kind!r}")
+
+
+def report_progress(job, name):
+    progress = PHASE_PROGRESS.get(name)
+    if progress is not None:
+        job.progress = progress
+        # Also keeps the job from looking stale.
+        ReportJob.objects.filter(pk=job.pk).update(
+            progress=progress, updated_at=timezone.now()
+        )
+
+
+def run_job(job):
+    try:
+        with phase_listener(lambda name: report_progress(job, name)):
+            key = build_report(job)
+    except Exception as e:
+        logger.exception(f"Report job {job.pk} failed: {e}")
+        job.status = ReportJob.FAILED
+        job.error = str(e)
+    else:
+        if key is None:
+            job.status = ReportJob.FAILED
+            job.error = f"No {job.kind} report data for {job.period}"
+        else:
+            job.status = ReportJob.DONE
+            job.report_key = key
+    job.progress = 100
+    job.save(update_fields=["status", "error", "report_key", "progress", "updated_at"])
+    return job
+
+
+def work(stop=None, poll_interval=1.0, once=False):
+    """
+    Claim and run jobs until `stop` is set, or until the queue is empty when
+    `once` is true. Returns the number of jobs run.
+    """
+    stop = stop or threading.Event()
+    count = 0
+    while not stop.is_set():
+        if not connection.in_atomic_block:
+            # Long running workers honour CONN_MAX_AGE like request threads.
+            close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        started = time.perf_counter()
+        run_job(job)
+        count += 1
+        logger.info(
+            "Report job %s %s %s %s in %.3fs",
+            job.pk,
+            job.kind,
+            job.period,
+            job.status,
+            time.perf_counter() - started,
+        )
+    return count
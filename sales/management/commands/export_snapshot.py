@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.snapshot import CHUNK_SIZE, SNAPSHOT_FORMATS, export_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Export Sales, Inventory and Expenditure to a columnar snapshot with "
+        "one file per table and month, rewriting only the months that changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=getattr(settings, "SNAPSHOT_ROOT", "snapshots"),
+            help="Snapshot directory. Defaults to SNAPSHOT_ROOT.",
+        )
+        parser.add_argument(
+            "--format", choices=sorted(SNAPSHOT_FORMATS), default="arrow"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Rows fetched and written per batch.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rewrite every partition, changed or not.",
+        )
+
+    def handle(self, *args, output, format, chunk_size, full=False, **options):
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        try:
+            result = export_snapshot(output, format, chunk_size, full)
+        except ValueError as e:
+            raise CommandError(str(e))
+        for table, period, rows in result["written"]:
+            self.stdout.write(f"wrote {table} {period} ({rows} rows)")
+        for table, period in result["removed"]:
+            self.stdout.write(f"removed {table} {period}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(result['written'])} partitions, "
+                f"{result['unchanged']} unchanged."
+            )
+        )
@@ -0,0 +1,55 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.ingest import DEFAULT_BATCH_SIZE, INGEST_FORMATS, import_sales, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import sales from a CSV or JSON lines file with date, product "
+        "and pieces_sold columns, reporting each batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=INGEST_FORMATS,
+            help="Input format; taken from the file extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, path, format=None, batch_size, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+        ingest_format = format or os.path.splitext(path)[1].lstrip(".").lower()
+        if ingest_format not in INGEST_FORMATS:
+            raise CommandError("Pass --format csv or --format jsonl.")
+
+        if path == "-":
+            self.import_stream(sys.stdin.buffer, ingest_format, batch_size)
+        else:
+            try:
+                stream = open(path, "rb")
+            except OSError as e:
+                raise CommandError(str(e))
+            with stream:
+                self.import_stream(stream, ingest_format, batch_size)
+
+    def import_stream(self, stream, ingest_format, batch_size):
+        # Each batch is reported as soon as it is committed.
+        inserted = rejected = 0
+        for batch in import_sales(read_rows(stream, ingest_format), batch_size):
+            self.stdout.write(
+                f"batch {batch['batch']}: inserted {batch['inserted']}, "
+                f"rejected {len(batch['errors'])}"
+            )
+            for error in batch["errors"]:
+                self.stdout.write(f"  line {error['line']}: {error['error']}")
+            inserted += batch["inserted"]
+            rejected += len(batch["errors"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {inserted} sales, rejected {rejected}.")
+        )
@@ -0,0 +1,84 @@
+import os
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.exports import EXPORT_FORMATS
+from sales.management.commands.rebuild_rollups import parse_date
+from sales.prebuild import prebuild_reports
+
+REPORT_KINDS = ("daily", "monthly")
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generate the daily and monthly reports of a date range whose "
+        "data changed since they were last built. Meant to run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=parse_date,
+            help="First date, YYYY-MM-DD. Defaults to the start of this month.",
+        )
+        parser.add_argument(
+            "--end", type=parse_date, help="Last date, YYYY-MM-DD. Defaults to today."
+        )
+        parser.add_argument(
+            "--format",
+            action="append",
+            choices=sorted(EXPORT_FORMATS),
+            help="Export format to build; repeat for several. Defaults to xlsx.",
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            choices=REPORT_KINDS,
+            help="Report kind to build; repeat for several. Defaults to both.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes rendering files; 1 renders in this process.",
+        )
+        parser.add_argument("--upload-workers", type=int, default=4)
+
+    def handle(
+        self,
+        *args,
+        start=None,
+        end=None,
+        format=None,
+        kind=None,
+        processes,
+        upload_workers,
+        **options,
+    ):
+        end = end or date.today()
+        start = start or end.replace(day=1)
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+        if processes < 1 or upload_workers < 1:
+            raise CommandError("--processes and --upload-workers must be positive.")
+
+        # --end is inclusive on the command line, prebuild_reports takes a
+        # half-open range.
+        result = prebuild_reports(
+            start,
+            end + timedelta(days=1),
+            formats=format or ["xlsx"],
+            kinds=kind or REPORT_KINDS,
+            processes=processes,
+            upload_workers=upload_workers,
+        )
+        for report_kind, period, export_format in result["built"]:
+            self.stdout.write(f"built {report_kind} {period} {export_format}")
+        for report_kind, period, export_format in result["failed"]:
+            self.stdout.write(f"failed {report_kind} {period} {export_format}")
+        if result["failed"]:
+            raise CommandError(f"{len(result['failed'])} reports failed to build.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Built {len(result['built'])} reports.")
+        )
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.rollups import check_summaries, rebuild_summaries
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}. Please use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyProductSummary rollups from Sales, or check them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="First date, YYYY-MM-DD.")
+        parser.add_argument("--end", type=parse_date, help="Last date, YYYY-MM-DD.")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Compare the rollups with a fresh recompute instead of rebuilding.",
+        )
+
+    def handle(self, *args, start=None, end=None, check=False, **options):
+        # --end is inclusive on the command line, the rollup helpers take a
+        # half-open range.
+        end = end + timedelta(days=1) if end else None
+
+        if not check:
+            count = rebuild_summaries(start, end)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily summaries."))
+            return
+
+        mismatches = check_summaries(start, end)
+        for (day, product_id), stored, fresh in mismatches:
+            self.stdout.write(
+                f"{day} product={product_id}: stored={stored} expected={fresh}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} daily summaries are out of date.")
+        self.stdout.write(self.style.SUCCESS("Daily summaries are consistent."))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.management.commands.rebuild_rollups import parse_date
+from sales.stock import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = "Recompute the stock ledger from Inventory and Sales, or check it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_date, help="First date, YYYY-MM-DD.")
+        parser.add_argument("--end", type=parse_date, help="Last date, YYYY-MM-DD.")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Compare the ledger with the history instead of fixing it.",
+        )
+
+    def handle(self, *args, start=None, end=None, check=False, **options):
+        # --end is inclusive on the command line, reconcile_stock takes a
+        # half-open range.
+        end = end + timedelta(days=1) if end else None
+
+        mismatches = reconcile_stock(start, end, dry_run=check)
+        for (day, product_id), stored, fresh in mismatches:
+            self.stdout.write(
+                f"{day} product={product_id}: stored={stored} expected={fresh}"
+            )
+        if check and mismatches:
+            raise CommandError(f"{len(mismatches)} stock levels are out of date.")
+        if check:
+            self.stdout.write(self.style.SUCCESS("Stock levels are consistent."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} stock levels."))
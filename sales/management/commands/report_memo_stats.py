@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from sales.memo import is_process_local, memo_cache, memo_stats, reset_memo_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the hit ratio of the memoized daily and monthly reports, counted "
+        "by every process sharing the REPORT_MEMO_CACHE cache. Needs a shared "
+        "cache backend; a process-local one only holds this command's counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards."
+        )
+
+    def handle(self, *args, reset=False, **options):
+        if is_process_local(memo_cache()):
+            self.stderr.write(
+                self.style.WARNING(
+                    "REPORT_MEMO_CACHE is local to each process, so the server "
+                    "workers' counts can't be read from here."
+                )
+            )
+        for kind, stats in memo_stats().items():
+            ratio = stats["hit_ratio"]
+            ratio = "n/a" if ratio is None else f"{ratio:.1%}"
+            self.stdout.write(
+                f"{kind}: {stats['hits']} hits, {stats['misses']} misses, "
+                f"hit ratio {ratio}"
+            )
+        if reset:
+            reset_memo_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,168 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from sales import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time process startup, report generation end to end, bulk sales "
+        "ingestion and the profit engines against a throwaway database, "
+        "keeping reports in memory so no network is involved. With "
+        "--baseline, results are compared against an earlier run saved with "
+        "--save-baseline. The servers scenario, only run when asked for, load "
+        "tests uvicorn against the WSGI server with a local S3 stand-in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--products", type=int, default=20)
+        parser.add_argument("--days", type=int, default=31)
+        parser.add_argument(
+            "--sales-per-day",
+            type=int,
+            help="Synthetic sales per day for the suite; one per product by default.",
+        )
+        parser.add_argument(
+            "--scenario",
+            choices=[
+                "all",
+                "startup",
+                "suite",
+                "reports",
+                "ingest",
+                "engines",
+                "servers",
+            ],
+            default="all",
+        )
+        parser.add_argument("--ingest-rows", type=int, default=20_000)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per server scenario."
+        )
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--baseline", help="JSON baseline to compare against.")
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Write this run's results to --baseline instead of comparing.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed growth over the baseline before a metric is a regression.",
+        )
+
+    def handle(
+        self,
+        *args,
+        iterations,
+        products,
+        days,
+        sales_per_day,
+        scenario,
+        ingest_rows,
+        requests,
+        concurrency,
+        baseline,
+        save_baseline,
+        tolerance,
+        **options,
+    ):
+        if save_baseline and not baseline:
+            raise CommandError("--save-baseline needs --baseline PATH.")
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        groups = {
+            "startup": lambda: benchmarks.startup_time(iterations),
+            "suite": lambda: benchmarks.report_suite(
+                iterations, products, days, sales_per_day
+            ),
+            "reports": lambda: benchmarks.report_latency(iterations, products, days),
+            "ingest": lambda: benchmarks.ingest_throughput(ingest_rows),
+            "engines": benchmarks.engine_comparison,
+            "servers": lambda: benchmarks.server_throughput(
+                requests, concurrency, products, days
+            ),
+        }
+        try:
+            results = {}
+            for name, run in groups.items():
+                # Load tests need uvicorn and httpx, so "all" leaves them out.
+                if scenario == name or (scenario == "all" and name != "servers"):
+                    # Every group seeds its own data into an empty database.
+                    call_command("flush", interactive=False, verbosity=0)
+                    results.update(run())
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for name, stats in results.items():
+            self.stdout.write(self.format_stats(name, stats))
+
+        if not baseline:
+            return
+        meta = {
+            "iterations": iterations,
+            "products": products,
+            "days": days,
+            "sales_per_day": sales_per_day,
+        }
+        if save_baseline:
+            benchmarks.save_baseline(baseline, results, **meta)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {baseline}."))
+            return
+        if not os.path.exists(baseline):
+            raise CommandError(f"No baseline at {baseline}; run with --save-baseline.")
+
+        previous = benchmarks.load_baseline(baseline)
+        if previous.get("meta") != meta:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Baseline was recorded with {previous.get('meta')}, "
+                    f"this run used {meta}."
+                )
+            )
+        regressions = benchmarks.compare(results, previous, tolerance)
+        for name, metric, before, after in regressions:
+            self.stdout.write(
+                self.style.ERROR(f"{name} {metric}: {before} -> {after}")
+            )
+        if regressions:
+            raise CommandError(f"{len(regressions)} metrics regressed.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def format_stats(self, name, stats):
+        if "speedup" in stats:
+            return (
+                f"{name:<20} python {stats['python_ms']:>10.3f} ms  "
+                f"numpy {stats['numpy_ms']:>10.3f} ms  x{stats['speedup']}"
+            )
+        if "requests_per_sec" in stats:
+            return (
+                f"{name:<20} {stats['requests_per_sec']:>9} req/s  "
+                f"median {stats['median_ms']:>9.3f} ms  "
+                f"p95 {stats['p95_ms']:>9.3f} ms  errors {stats['errors']}"
+            )
+        if "rows_per_sec" in stats:
+            return (
+                f"{name:<20} {stats['rows_per_sec']:>9} rows/s  "
+                f"({stats['rows']} rows in {stats['seconds']:.3f} s)"
+            )
+        line = (
+            f"{name:<20} median {stats['median_ms']:>9.3f} ms  "
+            f"p95 {stats['p95_ms']:>9.3f} ms  min {stats['min_ms']:>9.3f} ms"
+        )
+        if "queries" in stats:
+            line += (
+                f"  queries {stats['queries']:>4}  "
+                f"peak {stats['peak_kb']:>9.1f} KiB"
+            )
+        return line
@@ -0,0 +1,140 @@
+"""
+Memoized profit reports in Django's cache framework. Entries live in the
+REPORT_MEMO_CACHE alias of CACHES, so every worker sharing that cache shares
+them, and so do the JSON and file report paths and both report engines.
+
+Every entry is tagged with the fingerprint of the rows its report reads
+(see report_cache) and only served while the database still gives the same
+fingerprint. Changes made by any process, bulk writes and rolled back
+transactions are all caught without signals, whatever the cache backend.
+With a process-local cache such as the default LocMemCache each worker just
+keeps its own entries and its own hit counts.
+"""
+import functools
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = "sales:memo"
+EPOCH_KEY = f"{KEY_PREFIX}:epoch"
+MEMO_KINDS = ("daily", "monthly")
+
+
+def memo_cache():
+    return caches[getattr(settings, "REPORT_MEMO_CACHE", "default")]
+
+
+def is_process_local(cache):
+    """Whether `cache` keeps its entries to the current process."""
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+def daily_period(date):
+    return date.isoformat()
+
+
+def monthly_period(month, year):
+    return f"{year}-{month:02d}"
+
+
+def _entry_key(kind, period):
+    return f"{KEY_PREFIX}:{kind}:{period}"
+
+
+def _stats_key(kind, outcome):
+    return f"{KEY_PREFIX}:stats:{kind}:{outcome}"
+
+
+def _all_stats_keys():
+    return [
+        _stats_key(kind, outcome)
+        for kind in MEMO_KINDS
+        for outcome in ("hits", "misses")
+    ]
+
+
+def _epoch(cache, values):
+    epoch = values.get(EPOCH_KEY)
+    if epoch is None:
+        # add() so processes racing after an eviction agree on one.
+        cache.add(EPOCH_KEY, uuid4().hex, None)
+        epoch = cache.get(EPOCH_KEY)
+    return epoch
+
+
+def _count(cache, kind, outcome):
+    key = _stats_key(kind, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def memoize_report(kind, period, fingerprint):
+    """
+    Memoize a profit function of `kind` ("daily" or "monthly") by the
+    period label `period(*args)` returns, for as long as
+    `fingerprint(*args)` is unchanged. Functions of the same kind give the
+    same rows and share their entries.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def memoized(*args):
+            cache = memo_cache()
+            entry_key = _entry_key(kind, period(*args))
+            values = cache.get_many([EPOCH_KEY, entry_key])
+            # Taken before computing: rows computed while the data changes
+            # are stored under the fingerprint they replace and never served.
+            tag = (_epoch(cache, values), fingerprint(*args))
+            entry = values.get(entry_key)
+            if entry is not None and entry[0] == tag:
+                _count(cache, kind, "hits")
+                return entry[1]
+            _count(cache, kind, "misses")
+            rows = func(*args)
+            cache.set(
+                entry_key,
+                (tag, rows),
+                getattr(settings, "REPORT_MEMO_TIMEOUT", 24 * 60 * 60),
+            )
+            return rows
+
+        return memoized
+
+    return decorator
+
+
+def invalidate_reports():
+    """
+    Forget every memoized report, e.g. to time reports built from scratch.
+    Data changes never need it.
+    """
+    memo_cache().set(EPOCH_KEY, uuid4().hex, None)
+
+
+def memo_stats():
+    """
+    {kind: {"hits", "misses", "hit_ratio"}}, counted across every process
+    sharing REPORT_MEMO_CACHE. A process-local cache only holds the calling
+    process's counts.
+    """
+    counts = memo_cache().get_many(_all_stats_keys())
+    stats = {}
+    for kind in MEMO_KINDS:
+        hits = counts.get(_stats_key(kind, "hits"), 0)
+        misses = counts.get(_stats_key(kind, "misses"), 0)
+        stats[kind] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        }
+    return stats
+
+
+def reset_memo_stats():
+    memo_cache().delete_many(_all_stats_keys())
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def fill_summaries(apps, schema_editor):
+    # The reports read sales only through the rollups, so existing sales are
+    # summarized here rather than reporting zero until rebuild_rollups runs.
+    Inventory = apps.get_model('sales', 'Inventory')
+    Sales = apps.get_model('sales', 'Sales')
+    DailyProductSummary = apps.get_model('sales', 'DailyProductSummary')
+
+    def valid_inventory(field):
+        # The inventory row in force on the sale date: the latest one dated
+        # on or before it, else the product's first.
+        rows = Inventory.objects.filter(product=models.OuterRef('product'))
+        return Coalesce(
+            models.Subquery(
+                rows.filter(date__lte=models.OuterRef('date'))
+                .order_by('-date', '-pk')
+                .values(field)[:1]
+            ),
+            models.Subquery(rows.order_by('date', 'pk').values(field)[:1]),
+        )
+
+    priced = (
+        Sales.objects.order_by()
+        .values('product', 'date')
+        .annotate(
+            pieces_sold_sum=models.Sum('pieces_sold'),
+            cost_price=valid_inventory('cost_price_per_piece'),
+            selling_price=valid_inventory('selling_price_per_piece'),
+        )
+    )
+    DailyProductSummary.objects.bulk_create(
+        (
+            DailyProductSummary(
+                date=row['date'],
+                product_id=row['product'],
+                pieces_sold=row['pieces_sold_sum'],
+                revenue=row['pieces_sold_sum'] * row['selling_price'],
+                cost=row['pieces_sold_sum'] * row['cost_price'],
+                profit=row['pieces_sold_sum']
+                * (row['selling_price'] - row['cost_price']),
+            )
+            for row in priced.iterator(chunk_size=BATCH_SIZE)
+            # Products without any inventory can't be priced.
+            if row['selling_price'] is not None
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('pieces_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sales.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product summaries',
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_summary')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
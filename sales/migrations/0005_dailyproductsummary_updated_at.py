@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_dailyproductsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyproductsummary',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
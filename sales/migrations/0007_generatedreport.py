@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('period', models.CharField(max_length=20)),
+                ('export_format', models.CharField(default='xlsx', max_length=10)),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('report_key', models.CharField(max_length=255)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'period', 'export_format'), name='unique_generated_report')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+import heapq
+from itertools import groupby
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_stock_levels(apps, schema_editor):
+    # Sales and inventory only adjust rows that exist, so the ledger starts
+    # from the existing history, as reconcile_stock would rebuild it: one
+    # streaming pass merging grouped inventory with grouped sales.
+    Inventory = apps.get_model('sales', 'Inventory')
+    Sales = apps.get_model('sales', 'Sales')
+    StockLevel = apps.get_model('sales', 'StockLevel')
+
+    def grouped(model, field):
+        return (
+            model.objects.order_by()
+            .values_list('product', 'date')
+            .annotate(total=models.Sum(field))
+            .order_by('product', 'date')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+
+    stocked_rows = (
+        ((product_id, day), total, 0)
+        for product_id, day, total in grouped(Inventory, 'total_pieces')
+    )
+    sold_rows = (
+        ((product_id, day), 0, total)
+        for product_id, day, total in grouped(Sales, 'pieces_sold')
+    )
+
+    def levels():
+        for key, rows in groupby(
+            heapq.merge(stocked_rows, sold_rows, key=lambda row: row[0]),
+            key=lambda row: row[0],
+        ):
+            rows = list(rows)
+            yield key, sum(row[1] for row in rows), sum(row[2] for row in rows)
+
+    StockLevel.objects.bulk_create(
+        (
+            StockLevel(
+                date=day,
+                product_id=product_id,
+                stocked=stocked,
+                sold=sold,
+                remaining=stocked - sold,
+            )
+            for (product_id, day), stocked, sold in levels()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_generatedreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('stocked', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+                ('remaining', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sales.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'remaining'], name='sales_stock_date_062f7b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='unique_stock_level')],
+            },
+        ),
+        migrations.RunPython(fill_stock_levels, migrations.RunPython.noop),
+    ]
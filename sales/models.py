@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
@@ -14,10 +14,17 @@ class Inventory(models.Model):
     total_pieces = models.IntegerField()
     cost_price_per_piece = models.DecimalField(max_digits=5, decimal_places=2)
     selling_price_per_piece = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Inventories"
+        indexes = [models.Index(fields=["date", "product"])]
     
+    def save(self, *args, **kwargs):
+        # The signals keep the rollups and the stock ledger in step, in the
+        # same transaction as the row itself.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         date = self.date 
@@ -31,6 +38,14 @@ class Sales(models.Model):
     
     class Meta:
         verbose_name_plural = "Sales"
+        indexes = [models.Index(fields=["date", "product"])]
+
+    def save(self, *args, **kwargs):
+        # The stock ledger is updated before the insert, so a failed write
+        # has to roll it back too.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         date = self.date 
         product = self.product
@@ -42,12 +57,124 @@ class Expenditure(models.Model):
     date = models.DateField()
     type = models.CharField(max_length=255)
     amount_spent = models.DecimalField(max_digits=8, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["date"])]
+
     def __str__(self):
         date = self.date 
         type = self.type
         return f"{type}_{date}"
-    
 
 
+class DailyProductSummary(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    pieces_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        verbose_name_plural = "Daily product summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "product"], name="unique_daily_product_summary"
+            )
+        ]
 
+    def __str__(self):
+        return f"{self.product_id}_{self.date}"
+
+
+class ReportJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = [QUEUED, RUNNING]
+
+    kind = models.CharField(max_length=20)
+    period = models.CharField(max_length=20)
+    export_format = models.CharField(max_length=10, default="xlsx")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    report_key = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+        constraints = [
+            # At most one queued or running job per report, so duplicate
+            # requests share the in-flight one.
+            models.UniqueConstraint(
+                fields=["kind", "period", "export_format"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="unique_active_report_job",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind}_{self.period}_{self.status}"
+
+
+class GeneratedReport(models.Model):
+    """
+    The latest stored report file for a period, with the fingerprint of the
+    data it was built from. Lets any process reuse a report built elsewhere,
+    e.g. by prebuild_reports, while its data is unchanged.
+    """
+
+    kind = models.CharField(max_length=20)
+    period = models.CharField(max_length=20)
+    export_format = models.CharField(max_length=10, default="xlsx")
+    fingerprint = models.CharField(max_length=40)
+    report_key = models.CharField(max_length=255)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "period", "export_format"],
+                name="unique_generated_report",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind}_{self.period}_{self.export_format}"
+
+
+class StockLevel(models.Model):
+    """
+    Running stock ledger entry for one product on one day: the pieces
+    stocked by that day's inventory, the pieces sold, and what remains.
+    Kept current by sales.stock as Sales and Inventory are written, so
+    remaining stock is a single row lookup.
+    """
+
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    stocked = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    remaining = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["date", "remaining"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "date"], name="unique_stock_level"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}_{self.date}"
@@ -0,0 +1,220 @@
+import io
+import logging
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .catalog import product_names
+from .exports import render_report
+from .models import DailyProductSummary, GeneratedReport, Inventory
+from .report_cache import daily_fingerprints, monthly_fingerprint
+from .storage import get_report_store
+from .views import (
+    DAILY_COLUMNS,
+    MONTHLY_COLUMNS,
+    calculate_profit_for_range,
+    daily_report_key,
+    daily_rows,
+    month_bounds,
+    monthly_report_key,
+    record_generated_report,
+)
+
+logger = logging.getLogger(__name__)
+
+ReportTask = namedtuple(
+    "ReportTask", "kind period export_format fingerprint key rows columns"
+)
+
+
+def daily_records_by_date(start, end):
+    """
+    Daily report records for every date in [start, end) from one scan of the
+    inventory, grouped by date in the order calculate_daily_profit uses.
+    """
+    pieces_sold = DailyProductSummary.objects.filter(
+        date=OuterRef("date"), product=OuterRef("product")
+    ).values("pieces_sold")
+    rows = (
+        Inventory.objects.filter(date__gte=start, date__lt=end)
+        .annotate(pieces_sold_sum=Coalesce(Subquery(pieces_sold), 0))
+        .order_by("date", "pk")
+        .values_list(
+            "product",
+            "date",
+            "total_pieces",
+            "cost_price_per_piece",
+            "selling_price_per_piece",
+            "pieces_sold_sum",
+        )
+    )
+    records = defaultdict(list)
+    for name, day, *record in product_names(rows):
+        records[day].append((name, *record))
+    return records
+
+
+def months_between(start, end):
+    """(month, year) of every month overlapping [start, end)."""
+    months = []
+    month, year = start.month, start.year
+    while month_bounds(month, year)[0] < end:
+        months.append((month, year))
+        month, year = month % 12 + 1, year + month // 12
+    return months
+
+
+def built_fingerprints(kind, export_format, periods):
+    return dict(
+        GeneratedReport.objects.filter(
+            kind=kind, export_format=export_format, period__in=periods
+        ).values_list("period", "fingerprint")
+    )
+
+
+def daily_tasks(start, end, formats):
+    fingerprints = daily_fingerprints(start, end)
+    records = daily_records_by_date(start, end)
+    periods = {day: day.isoformat() for day in records}
+    tasks = []
+    for export_format in formats:
+        built = built_fingerprints("daily", export_format, periods.values())
+        for day, day_records in records.items():
+            if built.get(periods[day]) == fingerprints[day]:
+                continue
+            tasks.append(
+                ReportTask(
+                    "daily",
+                    periods[day],
+                    export_format,
+                    fingerprints[day],
+                    daily_report_key(day, export_format),
+                    daily_rows(day_records, day),
+                    DAILY_COLUMNS,
+                )
+            )
+    return tasks
+
+
+def monthly_tasks(start, end, formats):
+    months = months_between(start, end)
+    if not months:
+        return []
+    periods = {(month, year): f"{year}-{month:02d}" for month, year in months}
+    fingerprints = {
+        period: monthly_fingerprint(*month_bounds(month, year))
+        for (month, year), period in periods.items()
+    }
+
+    # One grouped scan over the whole months yields every month's rows.
+    rows = defaultdict(list)
+    range_rows = calculate_profit_for_range(
+        month_bounds(*months[0])[0], month_bounds(*months[-1])[1], "month"
+    )
+    for row in range_rows or []:
+        year, month = map(int, row["period"].split("-"))
+        monthly_row = {"year": year, "month": month}
+        monthly_row.update((k, v) for k, v in row.items() if k != "period")
+        rows[row["period"]].append(monthly_row)
+
+    tasks = []
+    for export_format in formats:
+        built = built_fingerprints("monthly", export_format, periods.values())
+        for (month, year), period in periods.items():
+            if period not in rows or built.get(period) == fingerprints[period]:
+                continue
+            tasks.append(
+                ReportTask(
+                    "monthly",
+                    period,
+                    export_format,
+                    fingerprints[period],
+                    monthly_report_key(month, year, export_format),
+                    rows[period],
+                    MONTHLY_COLUMNS,
+                )
+            )
+    return tasks
+
+
+def prebuild_reports(
+    start,
+    end,
+    formats=("xlsx",),
+    kinds=("daily", "monthly"),
+    processes=None,
+    upload_workers=4,
+):
+    """
+    Build and store the reports for [start, end) whose data changed since
+    they were last built, so report requests find them ready.
+
+    The rows come from one scan of the range. Files are rendered by a pool
+    of `processes` worker processes (in this process when 1) and uploaded by
+    `upload_workers` threads as they finish. Returns {"built": [...],
+    "failed": [...]} listing (kind, period, format) tuples.
+    """
+    tasks = []
+    if "daily" in kinds:
+        tasks += daily_tasks(start, end, formats)
+    if "monthly" in kinds:
+        tasks += monthly_tasks(start, end, formats)
+
+    store = get_report_store()
+    built, failed = [], []
+
+    def describe(task):
+        return (task.kind, task.period, task.export_format)
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as uploaders:
+        uploading = {}
+        for task, data in rendered(tasks, processes):
+            if isinstance(data, Exception):
+                logger.error(f"Rendering {describe(task)} failed: {data}")
+                failed.append(describe(task))
+                continue
+            future = uploaders.submit(store.save, io.BytesIO(data), task.key)
+            uploading[future] = task
+
+        for future in as_completed(uploading):
+            task = uploading[future]
+            try:
+                saved = future.result()
+            except Exception as e:
+                logger.exception(f"Uploading {describe(task)} failed: {e}")
+                saved = False
+            if not saved:
+                failed.append(describe(task))
+                continue
+            record_generated_report(
+                task.kind, task.period, task.export_format, task.fingerprint, task.key
+            )
+            built.append(describe(task))
+
+    return {"built": built, "failed": failed}
+
+
+def rendered(tasks, processes):
+    """Yield (task, file bytes or the exception) as each file is rendered."""
+    if processes == 1:
+        for task in tasks:
+            try:
+                yield task, render_report(task.rows, task.columns, task.export_format)
+            except Exception as e:
+                yield task, e
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as renderers:
+        futures = {
+            renderers.submit(
+                render_report, task.rows, task.columns, task.export_format
+            ): task
+            for task in tasks
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
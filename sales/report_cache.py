@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import DailyProductSummary, Expenditure, Inventory, Product
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """
+    Process-local LRU cache of generated reports.
+
+    Entries are looked up by report kind, period and a fingerprint of the
+    rows the report was built from. A lookup with a different fingerprint
+    is a miss, so a report goes stale as soon as its data changes and the
+    next request rebuilds it.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind, period, fingerprint):
+        key = (kind, str(period))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, kind, period, fingerprint, value):
+        # A period holds a single entry: storing a new fingerprint replaces
+        # the stale one instead of leaving it to age out.
+        key = (kind, str(period))
+        with self._lock:
+            self._entries[key] = (fingerprint, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+report_cache = ReportCache(getattr(settings, "REPORT_CACHE_MAX_ENTRIES", 256))
+
+
+def fingerprint(*parts):
+    """A digest of `parts`, which must have a stable repr()."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+# Aggregates a report's rows are versioned by. They are named so grouped
+# per-day versions come out exactly like a single period's aggregate().
+# Every write stamps updated_at, so an insert or an edit raises the latest
+# stamp and a delete lowers the count; edits can't cancel each other out.
+ROW_VERSION = {"pk__count": Count("pk"), "updated_at__max": Max("updated_at")}
+
+
+def _product_version():
+    # Reports show product names, so every rename changes the fingerprints.
+    # The product list is small enough to hash whole.
+    return fingerprint(*Product.objects.order_by("pk").values_list("pk", "name"))
+
+
+def _row_version(queryset):
+    return queryset.aggregate(**ROW_VERSION)
+
+
+def daily_fingerprint(date):
+    return fingerprint(
+        _row_version(DailyProductSummary.objects.filter(date=date)),
+        _row_version(Inventory.objects.filter(date=date)),
+        _product_version(),
+    )
+
+
+def _versions_by_date(queryset, aggregates):
+    rows = queryset.order_by().values("date").annotate(**aggregates)
+    return {row["date"]: {name: row[name] for name in aggregates} for row in rows}
+
+
+def daily_fingerprints(start, end):
+    """
+    {date: daily_fingerprint(date)} for every date in [start, end), in two
+    grouped queries and the product version.
+    """
+    summaries = _versions_by_date(
+        DailyProductSummary.objects.filter(date__gte=start, date__lt=end),
+        ROW_VERSION,
+    )
+    inventories = _versions_by_date(
+        Inventory.objects.filter(date__gte=start, date__lt=end), ROW_VERSION
+    )
+    no_summaries = _row_version(DailyProductSummary.objects.none())
+    no_inventory = _row_version(Inventory.objects.none())
+    products = _product_version()
+    fingerprints = {}
+    day = start
+    while day < end:
+        fingerprints[day] = fingerprint(
+            summaries.get(day, no_summaries),
+            inventories.get(day, no_inventory),
+            products,
+        )
+        day += timedelta(days=1)
+    return fingerprints
+
+
+def monthly_fingerprint(start, end):
+    # The monthly report describes each product by the inventory valid at
+    # month end, which may be dated before the month itself.
+    return fingerprint(
+        _row_version(
+            DailyProductSummary.objects.filter(date__gte=start, date__lt=end)
+        ),
+        _row_version(Inventory.objects.filter(date__lt=end)),
+        _row_version(Expenditure.objects.filter(date__gte=start, date__lt=end)),
+        _product_version(),
+    )
+
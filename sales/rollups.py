@@ -0,0 +1,183 @@
+import logging
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DailyProductSummary, Inventory, Sales
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Keys refreshed per round trip, kept well below SQLite's variable limit.
+REFRESH_CHUNK_SIZE = 250
+
+
+def valid_inventory(field, product, on_date):
+    # `field` of the inventory row in force for `product` on `on_date`: the
+    # latest one dated on or before it, falling back to the product's first
+    # inventory when the sale predates all of them.
+    rows = Inventory.objects.filter(product=product)
+    return Coalesce(
+        Subquery(
+            rows.filter(date__lte=on_date).order_by("-date", "-pk").values(field)[:1]
+        ),
+        Subquery(rows.order_by("date", "pk").values(field)[:1]),
+    )
+
+
+def priced_sales(sales):
+    # Group a Sales queryset by (product, date), pricing each group from the
+    # inventory row valid on that date.
+    return (
+        sales.order_by()
+        .values("product", "date")
+        .annotate(
+            pieces_sold_sum=Sum("pieces_sold"),
+            cost_price=valid_inventory(
+                "cost_price_per_piece", OuterRef("product"), OuterRef("date")
+            ),
+            selling_price=valid_inventory(
+                "selling_price_per_piece", OuterRef("product"), OuterRef("date")
+            ),
+        )
+    )
+
+
+def summarize_sales(sales):
+    """
+    Return {(date, product_id): (pieces_sold, revenue, cost)} for the given
+    Sales queryset. Products without any inventory cannot be priced and are
+    left out, as they are in the reports.
+    """
+    summaries = {}
+    for row in priced_sales(sales).iterator(chunk_size=BATCH_SIZE):
+        if row["selling_price"] is None:
+            continue
+        pieces_sold = row["pieces_sold_sum"]
+        summaries[(row["date"], row["product"])] = (
+            pieces_sold,
+            pieces_sold * row["selling_price"],
+            pieces_sold * row["cost_price"],
+        )
+    return summaries
+
+
+def _summary(key, values):
+    pieces_sold, revenue, cost = values
+    return DailyProductSummary(
+        date=key[0],
+        product_id=key[1],
+        pieces_sold=pieces_sold,
+        revenue=revenue,
+        cost=cost,
+        profit=revenue - cost,
+    )
+
+
+def refresh_summaries(keys):
+    """Recompute the rollups for an iterable of (date, product_id) keys."""
+    keys = sorted(set(keys))
+    for start in range(0, len(keys), REFRESH_CHUNK_SIZE):
+        _refresh_chunk(keys[start : start + REFRESH_CHUNK_SIZE])
+
+
+def _refresh_chunk(keys):
+    dates = {day for day, _ in keys}
+    product_ids = {product_id for _, product_id in keys}
+    with transaction.atomic():
+        fresh = summarize_sales(
+            Sales.objects.filter(date__in=dates, product__in=product_ids)
+        )
+        stored = {
+            (summary.date, summary.product_id): summary
+            for summary in DailyProductSummary.objects.filter(
+                date__in=dates, product__in=product_ids
+            )
+        }
+        to_create, to_update, stale = [], [], []
+        now = timezone.now()
+        for key in keys:
+            summary = stored.get(key)
+            if key not in fresh:
+                if summary is not None:
+                    stale.append(summary.pk)
+                continue
+            if summary is None:
+                to_create.append(_summary(key, fresh[key]))
+                continue
+            pieces_sold, revenue, cost = fresh[key]
+            if (summary.pieces_sold, summary.revenue, summary.cost) != fresh[key]:
+                summary.pieces_sold = pieces_sold
+                summary.revenue = revenue
+                summary.cost = cost
+                summary.profit = revenue - cost
+                summary.updated_at = now
+                to_update.append(summary)
+
+        DailyProductSummary.objects.filter(pk__in=stale).delete()
+        DailyProductSummary.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        DailyProductSummary.objects.bulk_update(
+            to_update,
+            ["pieces_sold", "revenue", "cost", "profit", "updated_at"],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def _in_range(queryset, start=None, end=None, product_ids=None):
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lt=end)
+    if product_ids is not None:
+        queryset = queryset.filter(product__in=product_ids)
+    return queryset
+
+
+def rebuild_summaries(start=None, end=None, product_ids=None):
+    """
+    Replace the rollups in [start, end) with a fresh recompute from Sales.
+    Returns the number of summaries written.
+    """
+    with transaction.atomic():
+        _in_range(DailyProductSummary.objects.all(), start, end, product_ids).delete()
+        fresh = summarize_sales(_in_range(Sales.objects.all(), start, end, product_ids))
+        DailyProductSummary.objects.bulk_create(
+            (_summary(key, values) for key, values in fresh.items()),
+            batch_size=BATCH_SIZE,
+        )
+    logger.debug("Rebuilt %d daily product summaries", len(fresh))
+    return len(fresh)
+
+
+def inventory_changed(product_id, day):
+    # Inventory dated `day` prices the product's sales from that day on. When
+    # it is (or was) the product's earliest inventory it also prices every
+    # earlier sale, so the whole history has to be refreshed.
+    since = day
+    if not Inventory.objects.filter(product=product_id, date__lt=day).exists():
+        since = None
+    rebuild_summaries(start=since, product_ids=[product_id])
+
+
+def check_summaries(start=None, end=None):
+    """
+    Compare the stored rollups in [start, end) against a fresh recompute and
+    return a list of (key, stored, fresh) tuples for every key that differs.
+    Missing rows are reported as None.
+    """
+    fresh = summarize_sales(_in_range(Sales.objects.all(), start, end))
+    stored = {
+        (summary.date, summary.product_id): (
+            summary.pieces_sold,
+            summary.revenue,
+            summary.cost,
+        )
+        for summary in _in_range(DailyProductSummary.objects.all(), start, end)
+    }
+    mismatches = []
+    for key in sorted(fresh.keys() | stored.keys()):
+        if fresh.get(key) != stored.get(key):
+            mismatches.append((key, stored.get(key), fresh.get(key)))
+    return mismatches
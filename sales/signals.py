@@ -0,0 +1,89 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .models import Inventory, Product, Sales
+from .rollups import inventory_changed, refresh_summaries
+from .stock import restock, sell, take_stock
+
+
+def _product_deletion(origin):
+    # Summaries cascade with their product, so there is nothing to refresh
+    # when the delete started from a Product.
+    return getattr(origin, "model", type(origin)) is Product
+
+
+@receiver(pre_save, sender=Sales)
+@receiver(pre_save, sender=Inventory)
+def remember_rollup_key(sender, instance, **kwargs):
+    # Keep the (date, product) a row is moving away from so its rollup is
+    # refreshed as well.
+    instance._previous_rollup_key = None
+    instance._previous_pieces = 0
+    if instance.pk is not None:
+        pieces_field = "pieces_sold" if sender is Sales else "total_pieces"
+        previous = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("date", "product", pieces_field)
+            .first()
+        )
+        if previous is not None:
+            instance._previous_rollup_key = previous[:2]
+            instance._previous_pieces = previous[2]
+
+
+@receiver(pre_save, sender=Sales)
+def sales_take_stock(sender, instance, **kwargs):
+    # Before the write, so with STOCK_PREVENT_OVERSELL an oversell is
+    # refused before the sale exists. Sales.save() runs this and the write
+    # in one transaction.
+    changes = {(instance.date, instance.product_id): instance.pieces_sold}
+    previous = instance._previous_rollup_key
+    if previous is not None:
+        changes[previous] = changes.get(previous, 0) - instance._previous_pieces
+    sell(changes)
+
+
+@receiver(post_save, sender=Sales)
+def sales_saved(sender, instance, **kwargs):
+    keys = {(instance.date, instance.product_id)}
+    previous = getattr(instance, "_previous_rollup_key", None)
+    if previous is not None:
+        keys.add(previous)
+    refresh_summaries(keys)
+
+
+@receiver(post_delete, sender=Sales)
+def sales_deleted(sender, instance, origin=None, **kwargs):
+    if not _product_deletion(origin):
+        refresh_summaries([(instance.date, instance.product_id)])
+        take_stock({(instance.date, instance.product_id): -instance.pieces_sold})
+
+
+@receiver(post_save, sender=Inventory)
+def inventory_saved(sender, instance, **kwargs):
+    changes = {instance.product_id: instance.date}
+    previous = getattr(instance, "_previous_rollup_key", None)
+    if previous is not None:
+        day, product_id = previous
+        changes[product_id] = min(day, changes.get(product_id, day))
+    for product_id, day in changes.items():
+        inventory_changed(product_id, day)
+    keys = {(instance.date, instance.product_id)}
+    if previous is not None:
+        keys.add(previous)
+    restock(keys)
+
+
+@receiver(post_delete, sender=Inventory)
+def inventory_deleted(sender, instance, origin=None, **kwargs):
+    if not _product_deletion(origin):
+        inventory_changed(instance.product_id, instance.date)
+        restock([(instance.date, instance.product_id)])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+
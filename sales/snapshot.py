@@ -0,0 +1,500 @@
+"""
+Columnar snapshots of the trading history for offline analysis.
+
+export_snapshot() streams Sales, Inventory and Expenditure into one file per
+table and month, <root>/<table>/<YYYY-MM>.arrow, next to the product list
+and a manifest.json holding each partition's fingerprint. Later exports only
+rewrite the partitions whose fingerprint changed. Money is stored as int64
+paise, the unit of the numpy engine in vectorized.py.
+
+load_snapshot() memory-maps a snapshot, and its Snapshot runs the daily and
+monthly reports on the numpy engine without a database. pyarrow and numpy
+are imported on first use.
+"""
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import ExtractDay, Length, TruncMonth
+
+from . import vectorized
+from .models import Expenditure, Inventory, Product, Sales
+from .report_cache import fingerprint
+from .views import month_bounds
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10_000
+MANIFEST = "manifest.json"
+# Bumped whenever the layout or the columns change, so older snapshots are
+# rewritten in full.
+SNAPSHOT_VERSION = 1
+# Arrow IPC files are memory-mapped without decoding; Parquet files are
+# smaller but decoded on load.
+SNAPSHOT_FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# `columns` are (name, arrow type, field or expression) triples. `version`
+# are the aggregates a partition is fingerprinted by, in the style of
+# report_cache.ROW_VERSION: changes that keep all of them equal, such
+# as two rows swapping values, are only picked up by a full export. Tables
+# without a version are rewritten on every export.
+SnapshotTable = namedtuple("SnapshotTable", "model columns version partitioned")
+
+ROW_VERSION = {"pk__count": Count("pk"), "pk__max": Max("pk"), "pk__sum": Sum("pk")}
+DATED_VERSION = {**ROW_VERSION, "day__sum": Sum(ExtractDay("date"))}
+
+TABLES = {
+    "products": SnapshotTable(
+        Product,
+        (("id", "int64", "pk"), ("name", "string", "name")),
+        # Renames keep every aggregate of the table equal, and the product
+        # list is small.
+        None,
+        partitioned=False,
+    ),
+    "sales": SnapshotTable(
+        Sales,
+        (
+            ("id", "int64", "pk"),
+            ("date", "date32", "date"),
+            ("product_id", "int64", "product"),
+            ("pieces_sold", "int64", "pieces_sold"),
+        ),
+        {
+            **DATED_VERSION,
+            "product__sum": Sum("product"),
+            "pieces_sold__sum": Sum("pieces_sold"),
+        },
+        partitioned=True,
+    ),
+    "inventory": SnapshotTable(
+        Inventory,
+        (
+            ("id", "int64", "pk"),
+            ("date", "date32", "date"),
+            ("product_id", "int64", "product"),
+            ("total_pieces", "int64", "total_pieces"),
+            ("cost_price_paise", "int64", vectorized.paise(F("cost_price_per_piece"))),
+            (
+                "selling_price_paise",
+                "int64",
+                vectorized.paise(F("selling_price_per_piece")),
+            ),
+        ),
+        {
+            **DATED_VERSION,
+            "product__sum": Sum("product"),
+            "total_pieces__sum": Sum("total_pieces"),
+            "cost_price_per_piece__sum": Sum("cost_price_per_piece"),
+            "selling_price_per_piece__sum": Sum("selling_price_per_piece"),
+        },
+        partitioned=True,
+    ),
+    "expenditure": SnapshotTable(
+        Expenditure,
+        (
+            ("id", "int64", "pk"),
+            ("date", "date32", "date"),
+            ("type", "string", "type"),
+            ("amount_spent_paise", "int64", vectorized.paise(F("amount_spent"))),
+        ),
+        {
+            **DATED_VERSION,
+            "type__length": Sum(Length("type")),
+            "amount_spent__sum": Sum("amount_spent"),
+        },
+        partitioned=True,
+    ),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Snapshots need the pyarrow package.")
+    return pa, ipc, pq
+
+
+def table_schema(table):
+    pa = _pyarrow()[0]
+    return pa.schema(
+        (name, getattr(pa, arrow_type)()) for name, arrow_type, _ in table.columns
+    )
+
+
+def partition_fingerprints(table):
+    """
+    {period: fingerprint} of every partition of `table`, in one query. The
+    fingerprint is None for tables without a version.
+    """
+    queryset = table.model.objects.order_by()
+    if table.version is None:
+        return {"all": None}
+    if not table.partitioned:
+        return {"all": fingerprint(queryset.aggregate(**table.version))}
+    rows = (
+        queryset.annotate(month=TruncMonth("date"))
+        .values("month")
+        .annotate(**table.version)
+    )
+    return {
+        row["month"].strftime("%Y-%m"): fingerprint(
+            {name: row[name] for name in table.version}
+        )
+        for row in rows
+    }
+
+
+def period_bounds(period):
+    year, month = map(int, period.split("-"))
+    return month_bounds(month, year)
+
+
+def partition_rows(table, period, chunk_size):
+    queryset = table.model.objects.all()
+    if table.partitioned:
+        start, end = period_bounds(period)
+        queryset = queryset.filter(date__gte=start, date__lt=end)
+    return (
+        queryset.order_by("pk")
+        .values_list(*(source for _, _, source in table.columns))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def write_partition(path, schema, rows, file_format, chunk_size):
+    """
+    Write `rows` to `path` one record batch of `chunk_size` rows at a time,
+    replacing the file only once it is complete. Returns the row count.
+    """
+    pa, ipc, pq = _pyarrow()
+    partial = path.with_name(path.name + ".partial")
+    if file_format == "arrow":
+        writer = ipc.new_file(str(partial), schema)
+    else:
+        writer = pq.ParquetWriter(str(partial), schema)
+    count = 0
+    rows = iter(rows)
+    with writer:
+        while chunk := list(islice(rows, chunk_size)):
+            writer.write_batch(
+                pa.RecordBatch.from_arrays(
+                    [
+                        pa.array(values, type=field.type)
+                        for values, field in zip(zip(*chunk), schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            count += len(chunk)
+    os.replace(partial, path)
+    return count
+
+
+def read_manifest(root):
+    try:
+        with open(Path(root) / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def export_snapshot(root, file_format="arrow", chunk_size=CHUNK_SIZE, full=False):
+    """
+    Export the history to the snapshot under `root`, rewriting only the
+    partitions that changed since the last export (all of them with `full`,
+    or when the format or layout changed) and removing those whose rows are
+    gone. Returns {"written": [(table, period, rows)], "removed": [(table,
+    period)], "unchanged": count}.
+    """
+    if file_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unsupported snapshot format {file_format!r}.")
+    root = Path(root)
+    previous = read_manifest(root)
+    old_tables = previous.get("tables", {})
+    reusable = (
+        {}
+        if full
+        or previous.get("version") != SNAPSHOT_VERSION
+        or previous.get("format") != file_format
+        else old_tables
+    )
+
+    written, removed, unchanged = [], [], 0
+    tables = {}
+    for name, table in TABLES.items():
+        (root / name).mkdir(parents=True, exist_ok=True)
+        schema = table_schema(table)
+        # Fingerprinted before the rows are read: a partition written while
+        # it changes keeps the older fingerprint and is rewritten next time.
+        fingerprints = partition_fingerprints(table)
+        tables[name] = {}
+        for period, version in sorted(fingerprints.items()):
+            entry = reusable.get(name, {}).get(period)
+            if (
+                entry is not None
+                and version is not None
+                and entry["fingerprint"] == version
+                and (root / entry["file"]).exists()
+            ):
+                tables[name][period] = entry
+                unchanged += 1
+                continue
+            file = f"{name}/{period}{SNAPSHOT_FORMATS[file_format]}"
+            rows = write_partition(
+                root / file,
+                schema,
+                partition_rows(table, period, chunk_size),
+                file_format,
+                chunk_size,
+            )
+            tables[name][period] = {
+                "file": file,
+                "rows": rows,
+                "fingerprint": version,
+            }
+            written.append((name, period, rows))
+
+        for period, entry in old_tables.get(name, {}).items():
+            if tables[name].get(period, {}).get("file") != entry["file"]:
+                (root / entry["file"]).unlink(missing_ok=True)
+                if period not in tables[name]:
+                    removed.append((name, period))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "format": file_format,
+        "money": "paise",
+        "tables": tables,
+    }
+    partial = root / f"{MANIFEST}.partial"
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(partial, root / MANIFEST)
+    logger.debug(
+        "Snapshot %s: %d partitions written, %d removed, %d unchanged",
+        root,
+        len(written),
+        len(removed),
+        unchanged,
+    )
+    return {"written": written, "removed": removed, "unchanged": unchanged}
+
+
+# Inventory and sales rows are looked up by product and day through a single
+# sorted int64 key, product_id * DAY_SPAN + days since DAY_ZERO.
+DAY_ZERO = date(1900, 1, 1)
+DAY_SPAN = 1 << 17
+
+
+def _days(column):
+    # date32 values count days since 1970-01-01.
+    pa = _pyarrow()[0]
+    epoch = (date(1970, 1, 1) - DAY_ZERO).days
+    return column.cast(pa.int32()).to_numpy().astype("int64") + epoch
+
+
+def _sum_by(keys, *values):
+    """The sorted distinct `keys` and the sum of each of `values` per key."""
+    import numpy as np
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = []
+    for column in values:
+        total = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(total, inverse, column)
+        sums.append(total)
+    return unique, *sums
+
+
+def _aligned(unique, sums, keys):
+    # sums[i] for each key equal to unique[i], 0 for keys not in `unique`.
+    import numpy as np
+
+    position = np.searchsorted(unique, keys)
+    found = position < len(unique)
+    found[found] = unique[position[found]] == keys[found]
+    return np.where(found, np.append(sums, 0)[np.minimum(position, len(unique))], 0)
+
+
+class Snapshot:
+    """A snapshot written by export_snapshot(), read through memory maps."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.manifest = read_manifest(self.root)
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"No snapshot of version {SNAPSHOT_VERSION} in {root}.")
+        self._names = None
+        self._inventory = None
+
+    def periods(self, name):
+        return sorted(self.manifest["tables"][name])
+
+    def read(self, file):
+        pa, ipc, pq = _pyarrow()
+        path = str(self.root / file)
+        if self.manifest["format"] == "arrow":
+            # The table's buffers point into the mapping; nothing is copied.
+            return ipc.open_file(pa.memory_map(path)).read_all()
+        return pq.read_table(path, memory_map=True)
+
+    def table(self, name, start=None, end=None):
+        """
+        The rows of `name` as a pyarrow Table, limited to [start, end) when
+        given. Only the partitions overlapping the range are opened.
+        """
+        import pyarrow.compute as pc
+
+        table = TABLES[name]
+        parts = []
+        for period, entry in sorted(self.manifest["tables"][name].items()):
+            if table.partitioned:
+                period_start, period_end = period_bounds(period)
+                if (end is not None and period_start >= end) or (
+                    start is not None and period_end <= start
+                ):
+                    continue
+            parts.append(self.read(entry["file"]))
+        schema = table_schema(table)
+        rows = _pyarrow()[0].concat_tables(parts) if parts else schema.empty_table()
+        if start is not None:
+            rows = rows.filter(pc.greater_equal(rows["date"], start))
+        if end is not None:
+            rows = rows.filter(pc.less(rows["date"], end))
+        return rows
+
+    def names(self):
+        if self._names is None:
+            products = self.table("products")
+            self._names = dict(
+                zip(products["id"].to_pylist(), products["name"].to_pylist())
+            )
+        return self._names
+
+    def inventory(self):
+        """
+        Every inventory row as int64 arrays sorted by product, date and id,
+        keyed for valid_rows().
+        """
+        import numpy as np
+
+        if self._inventory is None:
+            rows = self.table("inventory")
+            product = rows["product_id"].to_numpy()
+            days = _days(rows["date"])
+            order = np.lexsort((rows["id"].to_numpy(), days, product))
+            self._inventory = {
+                "key": (product * DAY_SPAN + days)[order],
+                "product": product[order],
+                "pieces": rows["total_pieces"].to_numpy()[order],
+                "cost": rows["cost_price_paise"].to_numpy()[order],
+                "selling": rows["selling_price_paise"].to_numpy()[order],
+            }
+        return self._inventory
+
+    def valid_rows(self, products, days):
+        """
+        Index into inventory() of the row in force for each product on each
+        day, as rollups.valid_inventory picks it: the latest one dated on or
+        before the day, else the product's first. -1 for unstocked products.
+        """
+        import numpy as np
+
+        inventory = self.inventory()
+        keys, stocked = inventory["key"], inventory["product"]
+        if not len(keys):
+            return np.full(len(products), -1)
+        latest = np.searchsorted(keys, products * DAY_SPAN + days, side="right") - 1
+        first = np.searchsorted(keys, products * DAY_SPAN)
+        rows = np.where(
+            (latest >= 0) & (stocked[np.maximum(latest, 0)] == products), latest, first
+        )
+        found = (rows < len(keys)) & (
+            stocked[np.minimum(rows, len(keys) - 1)] == products
+        )
+        return np.where(found, rows, -1)
+
+    def calculate_daily_profit(self, date):
+        """views.calculate_daily_profit() computed from the snapshot."""
+        next_day = date + timedelta(days=1)
+        inventory = self.table("inventory", date, next_day)
+        sales = self.table("sales", date, next_day)
+        product = inventory["product_id"].to_numpy()
+        sold_ids, sold = _sum_by(
+            sales["product_id"].to_numpy(), sales["pieces_sold"].to_numpy()
+        )
+        names = self.names()
+        # Partitions are written in id order, the order of the daily report.
+        return vectorized.daily_rows(
+            [names[product_id] for product_id in product.tolist()],
+            inventory["total_pieces"].to_numpy(),
+            inventory["cost_price_paise"].to_numpy(),
+            inventory["selling_price_paise"].to_numpy(),
+            _aligned(sold_ids, sold, product),
+            date,
+        )
+
+    def calculate_actual_profit_for_month(self, month, year):
+        """views.calculate_actual_profit_for_month() computed from the snapshot."""
+        import numpy as np
+
+        start, end = month_bounds(month, year)
+        inventory = self.inventory()
+
+        # Each product and day's sales priced like the daily rollups, from
+        # the inventory valid that day; unstocked products can't be priced.
+        sales = self.table("sales", start, end)
+        keys, pieces_sold = _sum_by(
+            sales["product_id"].to_numpy() * DAY_SPAN + _days(sales["date"]),
+            sales["pieces_sold"].to_numpy(),
+        )
+        rows = self.valid_rows(keys // DAY_SPAN, keys % DAY_SPAN)
+        priced = rows >= 0
+        rows, pieces_sold = rows[priced], pieces_sold[priced]
+        sold_ids, pieces_sold, revenue, cost = _sum_by(
+            keys[priced] // DAY_SPAN,
+            pieces_sold,
+            pieces_sold * inventory["selling"][rows],
+            pieces_sold * inventory["cost"][rows],
+        )
+
+        # Every stocked product, described by the row valid at month end.
+        product_ids = np.unique(inventory["product"])
+        last_day = (end - timedelta(days=1) - DAY_ZERO).days
+        rows = self.valid_rows(product_ids, np.full(len(product_ids), last_day))
+        names = self.names()
+
+        spent = self.table("expenditure", start, end)["amount_spent_paise"]
+        total_expenditure = (
+            vectorized.rupees(np.array([spent.to_numpy().sum()]))[0]
+            if len(spent)
+            else 0
+        )
+
+        return vectorized.monthly_rows(
+            [names[product_id] for product_id in product_ids.tolist()],
+            product_ids,
+            inventory["pieces"][rows],
+            inventory["cost"][rows],
+            inventory["selling"][rows],
+            sold_ids,
+            pieces_sold,
+            revenue,
+            cost,
+            total_expenditure,
+            month,
+            year,
+        )
+
+
+def load_snapshot(root):
+    return Snapshot(root)
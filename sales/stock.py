@@ -0,0 +1,246 @@
+"""
+Stock ledger. Every (product, date) with inventory or sales has a StockLevel
+row holding that day's stocked pieces (the sum of its inventory rows), the
+pieces sold and the remainder. Each day's stock is that day's inventory;
+unsold pieces don't carry over, as in the daily report.
+
+Sales adjust the ledger with single conditional UPDATEs on F() expressions,
+so concurrent sales can't lose each other's changes and, with
+STOCK_PREVENT_OVERSELL, a sale only goes through while enough pieces remain.
+"""
+import heapq
+import logging
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Inventory, Sales, StockLevel
+from .rollups import BATCH_SIZE, _in_range
+
+logger = logging.getLogger(__name__)
+
+
+class Oversell(ValueError):
+    """A sale would take more pieces than remain in stock."""
+
+
+def prevent_oversell():
+    return getattr(settings, "STOCK_PREVENT_OVERSELL", False)
+
+
+def _totals(queryset, field, keys):
+    # {(date, product_id): Sum(field)} for the given keys.
+    dates = {day for day, _ in keys}
+    product_ids = {product_id for _, product_id in keys}
+    return {
+        (day, product_id): total
+        for day, product_id, total in queryset.filter(
+            date__in=dates, product__in=product_ids
+        )
+        .order_by()
+        .values_list("date", "product")
+        .annotate(total=Sum(field))
+        if (day, product_id) in keys
+    }
+
+
+def _ensure_levels(keys):
+    # Create the ledger rows missing for `keys` from the history, so a row
+    # that was never written still starts from the right balance.
+    dates = {day for day, _ in keys}
+    product_ids = {product_id for _, product_id in keys}
+    existing = set(
+        StockLevel.objects.filter(date__in=dates, product__in=product_ids)
+        .values_list("date", "product")
+    )
+    missing = set(keys) - existing
+    if not missing:
+        return
+    stocked = _totals(Inventory.objects.all(), "total_pieces", missing)
+    sold = _totals(Sales.objects.all(), "pieces_sold", missing)
+    StockLevel.objects.bulk_create(
+        (
+            StockLevel(
+                date=day,
+                product_id=product_id,
+                stocked=stocked.get((day, product_id), 0),
+                sold=sold.get((day, product_id), 0),
+                remaining=stocked.get((day, product_id), 0)
+                - sold.get((day, product_id), 0),
+            )
+            for day, product_id in missing
+        ),
+        # Another process may have created some of them meanwhile.
+        ignore_conflicts=True,
+    )
+
+
+def take_stock(changes, enforce=None):
+    """
+    Apply {(date, product_id): pieces} sold (negative to give pieces back)
+    to the ledger. With `enforce` (STOCK_PREVENT_OVERSELL by default), keys
+    without enough pieces left are left unchanged and returned as
+    {key: pieces remaining}.
+    """
+    if enforce is None:
+        enforce = prevent_oversell()
+    changes = {key: pieces for key, pieces in changes.items() if pieces}
+    if not changes:
+        return {}
+    short = {}
+    with transaction.atomic():
+        _ensure_levels(changes)
+        # A fixed order so concurrent writers take the row locks alike.
+        for (day, product_id), pieces in sorted(changes.items()):
+            level = StockLevel.objects.filter(date=day, product=product_id)
+            if enforce and pieces > 0:
+                level = level.filter(remaining__gte=pieces)
+            updated = level.update(
+                sold=F("sold") + pieces, remaining=F("remaining") - pieces
+            )
+            if not updated:
+                short[(day, product_id)] = (
+                    StockLevel.objects.filter(date=day, product=product_id)
+                    .values_list("remaining", flat=True)
+                    .get()
+                )
+    return short
+
+
+def sell(changes):
+    """take_stock() for a single sale, raising Oversell when it is short."""
+    short = take_stock(changes)
+    if short:
+        (day, product_id), remaining = next(iter(short.items()))
+        raise Oversell(
+            f"Only {remaining} pieces of product {product_id} left on {day}."
+        )
+
+
+def restock(keys):
+    """Recompute the stocked pieces of (date, product_id) keys from Inventory."""
+    keys = set(keys)
+    if not keys:
+        return
+    with transaction.atomic():
+        _ensure_levels(keys)
+        stocked = _totals(Inventory.objects.all(), "total_pieces", keys)
+        for day, product_id in sorted(keys):
+            pieces = stocked.get((day, product_id), 0)
+            StockLevel.objects.filter(date=day, product=product_id).update(
+                stocked=pieces, remaining=pieces - F("sold")
+            )
+
+
+def stock_level(product_id, day):
+    """(stocked, sold, remaining) of a product on a day, in one row lookup."""
+    level = (
+        StockLevel.objects.filter(date=day, product=product_id)
+        .values_list("stocked", "sold", "remaining")
+        .first()
+    )
+    # No row means nothing was stocked or sold that day.
+    return level or (0, 0, 0)
+
+
+def low_stock(day, threshold):
+    """Ledger rows of `day` with at most `threshold` pieces left, lowest first."""
+    return (
+        StockLevel.objects.filter(date=day, remaining__lte=threshold)
+        .order_by("remaining", "product")
+        .values_list("product", "stocked", "sold", "remaining")
+    )
+
+
+def stock_history(start=None, end=None):
+    """
+    ((product_id, date), stocked, sold) for [start, end) in key order, merged
+    from one streaming pass over grouped inventory and grouped sales.
+    """
+
+    def grouped(model, field):
+        return (
+            _in_range(model.objects.all(), start, end)
+            .order_by()
+            .values_list("product", "date")
+            .annotate(total=Sum(field))
+            .order_by("product", "date")
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+
+    stocked = (
+        ((product_id, day), total, 0)
+        for product_id, day, total in grouped(Inventory, "total_pieces")
+    )
+    sold = (
+        ((product_id, day), 0, total)
+        for product_id, day, total in grouped(Sales, "pieces_sold")
+    )
+    for key, rows in groupby(
+        heapq.merge(stocked, sold, key=lambda row: row[0]), key=lambda row: row[0]
+    ):
+        rows = list(rows)
+        yield key, sum(row[1] for row in rows), sum(row[2] for row in rows)
+
+
+def reconcile_stock(start=None, end=None, dry_run=False):
+    """
+    Recompute the ledger for [start, end) from Inventory and Sales, reading
+    the history and the stored rows in one ordered pass, and rewrite only
+    the rows that differ. Returns (key, stored, fresh) for each of them, with
+    (stocked, sold) values and None for missing rows. With `dry_run` nothing
+    is written.
+    """
+    stored = (
+        ((product_id, day), (stocked, sold), pk)
+        for pk, product_id, day, stocked, sold in _in_range(
+            StockLevel.objects.all(), start, end
+        )
+        .order_by("product", "date")
+        .values_list("pk", "product", "date", "stocked", "sold")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    fresh = (
+        (key, (stocked, sold), None)
+        for key, stocked, sold in stock_history(start, end)
+    )
+
+    mismatches, to_create, to_update, stale = [], [], [], []
+    with transaction.atomic():
+        for (product_id, day), rows in groupby(
+            heapq.merge(stored, fresh, key=lambda row: row[0]),
+            key=lambda row: row[0],
+        ):
+            old = new = pk = None
+            for _, values, row_pk in rows:
+                if row_pk is None:
+                    new = values
+                else:
+                    old, pk = values, row_pk
+            # Signals leave an empty row behind when a key's history is gone.
+            if (old or (0, 0)) == (new or (0, 0)):
+                continue
+            mismatches.append(((day, product_id), old, new))
+            if new is None:
+                stale.append(pk)
+                continue
+            level = StockLevel(
+                pk=pk,
+                date=day,
+                product_id=product_id,
+                stocked=new[0],
+                sold=new[1],
+                remaining=new[0] - new[1],
+            )
+            (to_create if pk is None else to_update).append(level)
+
+        if not dry_run:
+            StockLevel.objects.filter(pk__in=stale).delete()
+            StockLevel.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            StockLevel.objects.bulk_update(
+                to_update, ["stocked", "sold", "remaining"], batch_size=BATCH_SIZE
+            )
+    logger.debug("Reconciled %d stock levels", len(mismatches))
+    return mismatches
@@ -0,0 +1,277 @@
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode, urlparse
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_client(region="us-east-1", endpoint_url=None):
+    """
+    Return this process's S3 client for `region`. boto3 and the .env file are
+    only loaded on first use, so commands and workers that never touch S3
+    don't pay for them. Clients are keyed by pid so forked workers never
+    share a connection pool with their parent. `endpoint_url` points the
+    client at an S3 compatible server instead of AWS.
+    """
+    key = (os.getpid(), region, endpoint_url)
+    client = _s3_clients.get(key)
+    if client is None:
+        with _s3_clients_lock:
+            client = _s3_clients.get(key)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                client = boto3.client(
+                    "s3",
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    region_name=region,
+                    endpoint_url=endpoint_url,
+                    config=Config(**s3_compatible_options(endpoint_url)),
+                )
+                _s3_clients[key] = client
+    return client
+
+
+def s3_compatible_options(endpoint_url):
+    if endpoint_url is None:
+        return {}
+    # Other servers rarely resolve bucket subdomains or accept the streamed
+    # checksums boto3 sends by default.
+    return {
+        "s3": {"addressing_style": "path"},
+        "request_checksum_calculation": "when_required",
+        "response_checksum_validation": "when_required",
+    }
+
+
+class ReportStore:
+    """
+    Where generated report files are kept. Keys are relative paths such as
+    "daily_reports/daily_report_2024-01-02.xlsx".
+    """
+
+    def save(self, fileobj, key):
+        """Store the binary file object under `key`; return True on success."""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Return a binary file object for `key`, or None if it is missing."""
+        raise NotImplementedError
+
+    def url(self, key):
+        """Return a URL the stored file can be fetched from, or None."""
+        raise NotImplementedError
+
+    def download_url(self, key, view="sales:download_excel"):
+        """
+        Return the link the report pages offer for downloading `key`. Stores
+        whose files are proxied through the app link to `view`.
+        """
+        return self.url(key)
+
+    def serves_url(self, url):
+        """
+        Whether `url` points into this store, so the download view may fetch
+        or redirect to it. Stores whose files aren't proxied serve none.
+        """
+        return False
+
+
+class S3ReportStore(ReportStore):
+    """
+    Keeps reports in an S3 bucket. Presigned URLs are cached per key, up to
+    `url_cache_size` keys, and reused while they have at least
+    `min_url_lifetime` seconds left, so repeat downloads of a report share
+    one URL that browsers and proxies can cache. Saving a key drops its URL.
+    """
+
+    def __init__(
+        self,
+        bucket="canteensales",
+        region="us-east-1",
+        expires_in=3600,
+        min_url_lifetime=900,
+        url_cache_size=256,
+        endpoint_url=None,
+    ):
+        self.bucket = bucket
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.expires_in = expires_in
+        self.min_url_lifetime = min_url_lifetime
+        self.url_cache_size = url_cache_size
+        # key -> (presigned URL, time.monotonic() it expires at), LRU order.
+        self._urls = OrderedDict()
+        self._urls_lock = threading.Lock()
+
+    @property
+    def client(self):
+        return get_s3_client(self.region, self.endpoint_url)
+
+    def save(self, fileobj, key):
+        from botocore.exceptions import NoCredentialsError
+
+        try:
+            self.client.upload_fileobj(fileobj, self.bucket, key)
+            return True
+        except NoCredentialsError:
+            logger.error("Credentials not available")
+            return False
+        finally:
+            # Browsers and proxies may have cached the old file under the
+            # old URL, so the new one gets a freshly signed URL.
+            self.forget_url(key)
+
+    def open(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def forget_url(self, key):
+        with self._urls_lock:
+            self._urls.pop(key, None)
+
+    def cached_url(self, key):
+        with self._urls_lock:
+            entry = self._urls.get(key)
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if expires_at - time.monotonic() < self.min_url_lifetime:
+                del self._urls[key]
+                return None
+            self._urls.move_to_end(key)
+            return url
+
+    def url(self, key):
+        url = self.cached_url(key)
+        if url is not None:
+            return url
+        signed_at = time.monotonic()
+        try:
+            url = self.client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=self.expires_in,
+            )
+        except Exception as e:
+            logger.error(f"Error generating presigned URL for {key}: {e}")
+            return None
+        with self._urls_lock:
+            self._urls[key] = (url, signed_at + self.expires_in)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.url_cache_size:
+                self._urls.popitem(last=False)
+        return url
+
+    def download_url(self, key, view="sales:download_excel"):
+        # Downloads are proxied through the app so the browser gets a proper
+        # attachment filename.
+        presigned_url = self.url(key)
+        if presigned_url is None:
+            return None
+        query = urlencode({"presigned_url": presigned_url})
+        return f"{reverse(view)}?{query}"
+
+    def serves_url(self, url):
+        parsed = urlparse(url)
+        in_bucket = parsed.path.startswith(f"/{self.bucket}/")
+        if self.endpoint_url is not None:
+            # Path style addressing, see s3_compatible_options().
+            endpoint = urlparse(self.endpoint_url)
+            return (
+                parsed.scheme == endpoint.scheme
+                and parsed.netloc == endpoint.netloc
+                and in_bucket
+            )
+        if parsed.scheme != "https":
+            return False
+        hosts = ("s3.amazonaws.com", f"s3.{self.region}.amazonaws.com")
+        return parsed.netloc in {f"{self.bucket}.{host}" for host in hosts} or (
+            parsed.netloc in hosts and in_bucket
+        )
+
+
+class LocalReportStore(ReportStore):
+    """Keeps reports on the local filesystem and serves them from the app."""
+
+    def __init__(self, root=None):
+        self.root = str(root or settings.BASE_DIR / "reports")
+
+    def path(self, key):
+        return safe_join(self.root, key)
+
+    def save(self, fileobj, key):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f)
+        return True
+
+    def open(self, key):
+        try:
+            return open(self.path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def url(self, key):
+        return reverse("sales:report_file", args=[key])
+
+
+class InMemoryReportStore(ReportStore):
+    """Process-local store for tests and offline benchmarks."""
+
+    def __init__(self):
+        self.files = {}
+
+    def save(self, fileobj, key):
+        self.files[key] = fileobj.read()
+        return True
+
+    def open(self, key):
+        if key not in self.files:
+            return None
+        return io.BytesIO(self.files[key])
+
+    def url(self, key):
+        return reverse("sales:report_file", args=[key])
+
+
+_report_store = None
+
+
+def get_report_store():
+    """Return the store configured by the REPORT_STORE setting."""
+    global _report_store
+    if _report_store is None:
+        config = getattr(settings, "REPORT_STORE", {})
+        backend = config.get("BACKEND", "sales.storage.S3ReportStore")
+        _report_store = import_string(backend)(**config.get("OPTIONS", {}))
+    return _report_store
+
+
+@receiver(setting_changed)
+def reset_report_store(setting, **kwargs):
+    global _report_store
+    if setting == "REPORT_STORE":
+        _report_store = None
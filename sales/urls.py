@@ -1,6 +1,7 @@
 # urls.py
 from django.urls import path
-from .views import home, generate_daily_profit,generate_monthly_profit,download_excel,reports
+from . import async_views
+from .views import home, generate_daily_profit,generate_monthly_profit,download_excel,reports,report_file,report_job_status,ingest_sales,profit_range,daily_profit_data,monthly_profit_data,stock_level,low_stock
 
 app_name = "sales"
 
@@ -10,5 +11,17 @@ urlpatterns = [
     path('api/generate-daily-profit/', generate_daily_profit, name='generate_daily_profit'),
     path('api/generate-monthly-profit/', generate_monthly_profit, name='generate_monthly_profit'),
     path('api/download-excel/', download_excel, name='download_excel'),
+    path('api/reports/<path:key>', report_file, name='report_file'),
+    path('api/report-jobs/<int:job_id>/', report_job_status, name='report_job_status'),
+    path('api/sales/import/', ingest_sales, name='ingest_sales'),
+    path('api/profit-range/', profit_range, name='profit_range'),
+    path('api/daily-profit/', daily_profit_data, name='daily_profit_data'),
+    path('api/monthly-profit/', monthly_profit_data, name='monthly_profit_data'),
+    path('api/stock/', stock_level, name='stock_level'),
+    path('api/stock/low/', low_stock, name='low_stock'),
+    # Async versions for ASGI servers.
+    path('api/async/generate-daily-profit/', async_views.generate_daily_profit, name='async_generate_daily_profit'),
+    path('api/async/generate-monthly-profit/', async_views.generate_monthly_profit, name='async_generate_monthly_profit'),
+    path('api/async/download-excel/', async_views.download_excel, name='async_download_excel'),
     
 ]
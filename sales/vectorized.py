@@ -0,0 +1,303 @@
+"""
+Array versions of the daily and monthly profit reports. Money is fetched as
+whole paise, rounded in the database, and all derived columns and totals
+are computed with int64 arrays, so the results match the Decimal versions
+in views.py exactly. numpy is imported on first use.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F, IntegerField, OuterRef, Sum
+from django.db.models.functions import Cast, Round
+
+from .catalog import product_names
+from .memo import daily_period, memoize_report, monthly_period
+from .models import DailyProductSummary, Expenditure, Product
+from .report_cache import daily_fingerprint
+from .rollups import valid_inventory
+from .views import (
+    DAILY_TOTAL_FIELDS,
+    MONTHLY_TOTAL_FIELDS,
+    daily_report_queryset,
+    month_bounds,
+    month_fingerprint,
+)
+
+
+def paise(expression):
+    return Cast(Round(expression * 100), IntegerField())
+
+
+def rupees(values):
+    # int64 paise back to two place Decimals, as the DecimalFields return.
+    # Prices and totals repeat a lot, so each distinct amount is converted
+    # once and shared; Decimals are immutable.
+    import numpy as np
+
+    amounts, index = np.unique(values, return_inverse=True)
+    decimals = [Decimal(amount).scaleb(-2) for amount in amounts.tolist()]
+    return [decimals[i] for i in index.tolist()]
+
+
+def columns(records, count):
+    """Transpose records into a list of names and one int64 array per field."""
+    import numpy as np
+
+    if not records:
+        return [], *(np.zeros(0, dtype=np.int64) for _ in range(count - 1))
+    names, *fields = zip(*records)
+    return list(names), *(np.array(field, dtype=np.int64) for field in fields)
+
+
+def daily_rows(names, pieces, cost, selling, sold, date):
+    """
+    Build the daily report from a name list and int64 arrays of pieces, cost
+    and selling price per piece in paise, and pieces sold.
+    """
+    import numpy as np
+
+    if not names:
+        return None
+
+    total_selling = sold * selling
+    total_cost = sold * cost
+    profit = total_selling - total_cost
+
+    day = date.strftime("%d/%m/%Y")
+    results = [
+        {
+            "product_name": name,
+            "date": day,
+            "pieces_sold": row_sold,
+            "pieces": row_pieces,
+            "cost_price_per_piece": row_cost,
+            "selling_price_per_piece": row_selling,
+            "total_selling_price": row_total_selling,
+            "total_cost_price": row_total_cost,
+            "profit": row_profit,
+        }
+        for (
+            name,
+            row_sold,
+            row_pieces,
+            row_cost,
+            row_selling,
+            row_total_selling,
+            row_total_cost,
+            row_profit,
+        ) in zip(
+            names,
+            sold.tolist(),
+            pieces.tolist(),
+            rupees(cost),
+            rupees(selling),
+            rupees(total_selling),
+            rupees(total_cost),
+            rupees(profit),
+        )
+    ]
+
+    total_result = {"product_name": "all", "date": day}
+    total_result.update(
+        zip(
+            DAILY_TOTAL_FIELDS,
+            [
+                int(sold.sum()),
+                int(pieces.sum()),
+                *rupees(
+                    np.array(
+                        [
+                            cost.sum(),
+                            selling.sum(),
+                            total_selling.sum(),
+                            total_cost.sum(),
+                            profit.sum(),
+                        ]
+                    )
+                ),
+            ],
+        )
+    )
+    results.append(total_result)
+    return results
+
+
+def daily_profit_records(date):
+    return product_names(
+        daily_report_queryset(date).values_list(
+            "product",
+            "total_pieces",
+            paise(F("cost_price_per_piece")),
+            paise(F("selling_price_per_piece")),
+            "pieces_sold_sum",
+        )
+    )
+
+
+@memoize_report("daily", daily_period, daily_fingerprint)
+def calculate_daily_profit(date):
+    return daily_rows(*columns(daily_profit_records(date), 5), date)
+
+
+@memoize_report("monthly", monthly_period, month_fingerprint)
+def calculate_actual_profit_for_month(month, year):
+    import numpy as np
+
+    start, end = month_bounds(month, year)
+    last_day = end - timedelta(days=1)
+
+    sold_ids, pieces_sold, revenue, cost = columns(
+        list(
+            DailyProductSummary.objects.filter(date__gte=start, date__lt=end)
+            .order_by("product")
+            .values("product")
+            .annotate(
+                pieces_sold_sum=Sum("pieces_sold"),
+                revenue_paise=paise(Sum("revenue")),
+                cost_paise=paise(Sum("cost")),
+            )
+            .values_list("product", "pieces_sold_sum", "revenue_paise", "cost_paise")
+        ),
+        4,
+    )
+    sold_ids = np.array(sold_ids, dtype=np.int64)
+
+    records = list(
+        Product.objects.annotate(
+            pieces=valid_inventory("total_pieces", OuterRef("pk"), last_day),
+            cost_price=paise(
+                valid_inventory("cost_price_per_piece", OuterRef("pk"), last_day)
+            ),
+            selling_price=paise(
+                valid_inventory("selling_price_per_piece", OuterRef("pk"), last_day)
+            ),
+        )
+        .filter(pieces__isnull=False)
+        .order_by("pk")
+        .values_list("name", "pk", "pieces", "cost_price", "selling_price")
+    )
+    names, product_ids, pieces, cost_price, selling_price = columns(records, 5)
+
+    aggregated_result = Expenditure.objects.filter(
+        date__gte=start, date__lt=end
+    ).aggregate(Sum("amount_spent"))
+    total_expenditure = aggregated_result["amount_spent__sum"] or 0
+    total_expenditure = round(total_expenditure, 2)
+
+    return monthly_rows(
+        names,
+        product_ids,
+        pieces,
+        cost_price,
+        selling_price,
+        sold_ids,
+        pieces_sold,
+        revenue,
+        cost,
+        total_expenditure,
+        month,
+        year,
+    )
+
+
+def monthly_rows(
+    names,
+    product_ids,
+    pieces,
+    cost_price,
+    selling_price,
+    sold_ids,
+    pieces_sold,
+    revenue,
+    cost,
+    total_expenditure,
+    month,
+    year,
+):
+    """
+    Build the monthly report from the stocked products (names, and int64
+    arrays of ids, pieces and the month end prices in paise), the month's
+    sales per product (int64 arrays of sorted ids, pieces sold, revenue and
+    cost in paise) and the month's expenditure.
+    """
+    import numpy as np
+
+    # Line the rollup sums up with the products, zero where nothing sold.
+    position = np.searchsorted(sold_ids, product_ids)
+    found = position < len(sold_ids)
+    found[found] = sold_ids[position[found]] == product_ids[found]
+    position[~found] = len(sold_ids)
+
+    def aligned(values):
+        return np.append(values, 0)[position]
+
+    row_sold = aligned(pieces_sold)
+    row_revenue = aligned(revenue)
+    row_cost = aligned(cost)
+
+    if total_expenditure == 0:
+        keep = row_sold != 0
+    else:
+        keep = np.ones(len(product_ids), dtype=bool)
+    names = [name for name, kept in zip(names, keep.tolist()) if kept]
+    pieces = pieces[keep]
+    cost_price = cost_price[keep]
+    selling_price = selling_price[keep]
+    row_sold = row_sold[keep]
+    row_revenue = row_revenue[keep]
+    row_cost = row_cost[keep]
+    profit = row_revenue - row_cost
+
+    if int(row_sold.sum()) == 0:
+        return None
+
+    results = [
+        {
+            "year": year,
+            "month": month,
+            "product_name": name,
+            "pieces": row_pieces,
+            "cost_price_per_piece": row_cost_price,
+            "selling_price_per_piece": row_selling_price,
+            "pieces_sold": row_pieces_sold,
+            "total_selling_price": row_total_selling,
+            "total_cost_price": row_total_cost,
+            "profit": row_profit,
+        }
+        for (
+            name,
+            row_pieces,
+            row_cost_price,
+            row_selling_price,
+            row_pieces_sold,
+            row_total_selling,
+            row_total_cost,
+            row_profit,
+        ) in zip(
+            names,
+            pieces.tolist(),
+            rupees(cost_price),
+            rupees(selling_price),
+            row_sold.tolist(),
+            rupees(row_revenue),
+            rupees(row_cost),
+            rupees(profit),
+        )
+    ]
+
+    total_result = {"year": year, "month": month, "product_name": "all"}
+    total_result.update(
+        zip(
+            MONTHLY_TOTAL_FIELDS,
+            [
+                int(pieces.sum()),
+                *rupees(np.array([cost_price.sum(), selling_price.sum()])),
+                int(row_sold.sum()),
+                *rupees(np.array([row_revenue.sum(), row_cost.sum(), profit.sum()])),
+            ],
+        )
+    )
+    total_result["total_expenditure"] = total_expenditure
+    total_result["actual_profit"] = total_result["profit"] - total_expenditure
+    results.append(total_result)
+    return results
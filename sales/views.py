@@ -1,223 +1,541 @@
+import csv
 import os
 import logging
-import requests
-import tempfile
-import pandas as pd
-from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse
-from rest_framework.decorators import api_view
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from .models import Inventory, Sales, Expenditure, Product
-from datetime import datetime
-from django.db.models import Sum
-import boto3
-from botocore.exceptions import NoCredentialsError
-from dotenv import load_dotenv
-import requests
+from .catalog import get_catalog, product_names
+from .ingest import DEFAULT_BATCH_SIZE, INGEST_FORMATS, import_sales, read_rows
+from .instrumentation import phase
+from .jobs import enqueue_report
+from .memo import daily_period, memoize_report, monthly_period
+from .models import (
+    DailyProductSummary,
+    Inventory,
+    Expenditure,
+    GeneratedReport,
+    Product,
+    ReportJob,
+)
+from .report_cache import (
+    daily_fingerprint,
+    monthly_fingerprint,
+    report_cache,
+)
+from .rollups import valid_inventory
+from . import stock
+from .exports import EXPORT_FORMATS, export_report
+from .storage import get_report_store
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db.models import DateField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
 from urllib.parse import unquote, urlencode, urlparse, urlunparse
 
-load_dotenv()
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# AWS S3 Configuration
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_STORAGE_BUCKET_NAME = "canteensales"
-AWS_REGION = "us-east-1"
-S3_FOLDER_DAILY = "daily_reports/"
-S3_FOLDER_MONTHLY = "monthly_reports/"
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION,
-)
-
+REPORT_FOLDER_DAILY = "daily_reports/"
+REPORT_FOLDER_MONTHLY = "monthly_reports/"
 
-def generate_excel_file(data, filename):
-    df = pd.DataFrame(data)
-    temp_dir = tempfile.mkdtemp()
-    # Save the Excel file in the temporary directory
-    excel_file_path = os.path.join(temp_dir, f"{filename}.xlsx")
-    df.to_excel(excel_file_path, index=False)
-    return excel_file_path
 
-
-def upload_to_s3(local_file_path, s3_folder, s3_filename):
-    try:
-        s3_client.upload_file(
-            local_file_path, AWS_STORAGE_BUCKET_NAME, f"{s3_folder}{s3_filename}"
+# Columns summed into the "all" row of a report.
+DAILY_TOTAL_FIELDS = (
+    "pieces_sold",
+    "pieces",
+    "cost_price_per_piece",
+    "selling_price_per_piece",
+    "total_selling_price",
+    "total_cost_price",
+    "profit",
+)
+DAILY_COLUMNS = ["product_name", "date", *DAILY_TOTAL_FIELDS]
+
+
+def daily_report_queryset(date):
+    # Pieces sold per product on this date come from the daily rollup,
+    # correlated to each inventory row so the report is a single query.
+    # Product names come from the catalog rather than a join.
+    pieces_sold = DailyProductSummary.objects.filter(
+        date=date, product=OuterRef("product")
+    ).values("pieces_sold")
+    return (
+        Inventory.objects.filter(date=date)
+        .annotate(pieces_sold_sum=Coalesce(Subquery(pieces_sold), 0))
+        .order_by("pk")
+    )
+
+
+def daily_report_records(date):
+    return product_names(
+        daily_report_queryset(date).values_list(
+            "product",
+            "total_pieces",
+            "cost_price_per_piece",
+            "selling_price_per_piece",
+            "pieces_sold_sum",
         )
-        return True
-    except NoCredentialsError:
-        logger.error("Credentials not available")
-        return False
+    )
 
 
-def calculate_daily_profit(date):
+def daily_rows(records, date):
+    """
+    Build the daily report from (product_name, pieces, cost_price_per_piece,
+    selling_price_per_piece, pieces_sold) records.
+    """
+    day = date.strftime("%d/%m/%Y")
     results = []
-    inventories = Inventory.objects.filter(date=date)
-
-    if not inventories.exists():
-        return None
-
-    for inventory in inventories:
-        sales = Sales.objects.filter(date=date, product=inventory.product).aggregate(
-            Sum("pieces_sold")
-        )
-        pieces_sold_sum = sales["pieces_sold__sum"] or 0
-        total_selling_price = pieces_sold_sum * inventory.selling_price_per_piece
-        total_cost_price = pieces_sold_sum * inventory.cost_price_per_piece
-        profit = total_selling_price - total_cost_price
-
+    totals = dict.fromkeys(DAILY_TOTAL_FIELDS, 0)
+    for name, pieces, cost_price, selling_price, pieces_sold_sum in records:
+        total_selling_price = pieces_sold_sum * selling_price
+        total_cost_price = pieces_sold_sum * cost_price
         result = {
-            "product_name": inventory.product.name,
-            "date": inventory.date.strftime("%d/%m/%Y"),
+            "product_name": name,
+            "date": day,
             "pieces_sold": pieces_sold_sum,
-            "pieces": inventory.total_pieces,
-            "cost_price_per_piece": inventory.cost_price_per_piece,
-            "selling_price_per_piece": inventory.selling_price_per_piece,
+            "pieces": pieces,
+            "cost_price_per_piece": cost_price,
+            "selling_price_per_piece": selling_price,
             "total_selling_price": total_selling_price,
             "total_cost_price": total_cost_price,
-            "profit": profit,
+            "profit": total_selling_price - total_cost_price,
         }
-
+        for field in DAILY_TOTAL_FIELDS:
+            totals[field] += result[field]
         results.append(result)
-    date_str = date.strftime("%d/%m/%Y")
-    total_result = {
-        "product_name": "all",
-        "date": date_str,
-        "pieces_sold": sum(entry["pieces_sold"] for entry in results),
-        "pieces": sum(entry["pieces"] for entry in results),
-        "cost_price_per_piece": sum(entry["cost_price_per_piece"] for entry in results),
-        "selling_price_per_piece": sum(
-            entry["selling_price_per_piece"] for entry in results
-        ),
-        "total_selling_price": sum(entry["total_selling_price"] for entry in results),
-        "total_cost_price": sum(entry["total_cost_price"] for entry in results),
-        "profit": sum(entry["profit"] for entry in results),
-    }
+
+    if not results:
+        return None
+
+    total_result = {"product_name": "all", "date": day}
+    total_result.update(totals)
     results.append(total_result)
     return results
 
 
-def calculate_actual_profit_for_month(month, year):
-    results = []
-    total_pieces_sold_sum = 0
+@memoize_report("daily", daily_period, daily_fingerprint)
+def calculate_daily_profit(date):
+    return daily_rows(daily_report_records(date), date)
 
-    for product in Product.objects.all():
-        # Retrieve the related Inventory for the Product
-        inventory = Inventory.objects.filter(product=product).first()
 
-        # If there is no related Inventory, skip this product
-        if not inventory:
-            continue
+MONTHLY_TOTAL_FIELDS = (
+    "pieces",
+    "cost_price_per_piece",
+    "selling_price_per_piece",
+    "pieces_sold",
+    "total_selling_price",
+    "total_cost_price",
+    "profit",
+)
+MONTHLY_COLUMNS = [
+    "year",
+    "month",
+    "product_name",
+    *MONTHLY_TOTAL_FIELDS,
+    "total_expenditure",
+    "actual_profit",
+]
+
+
+def month_bounds(month, year):
+    # Half-open [start, end) range covering the month.
+    start = datetime(year, month, 1).date()
+    end = datetime(year + month // 12, month % 12 + 1, 1).date()
+    return start, end
+
 
-        # Fetch expenditures for the specific product, month, and year
-        expenditures = Expenditure.objects.filter(
-            date__month=month, date__year=year
+def month_fingerprint(month, year):
+    return monthly_fingerprint(*month_bounds(month, year))
+
+
+@memoize_report("monthly", monthly_period, month_fingerprint)
+def calculate_actual_profit_for_month(month, year):
+    start, end = month_bounds(month, year)
+    last_day = end - timedelta(days=1)
+
+    # Month totals per product from the daily rollups, which already price
+    # every sale from the inventory valid on its date.
+    sold = {
+        row["product"]: (row["pieces_sold_sum"], row["revenue_sum"], row["cost_sum"])
+        for row in DailyProductSummary.objects.filter(date__gte=start, date__lt=end)
+        .order_by()
+        .values("product")
+        .annotate(
+            pieces_sold_sum=Sum("pieces_sold"),
+            revenue_sum=Sum("revenue"),
+            cost_sum=Sum("cost"),
         )
-        aggregated_result = expenditures.aggregate(Sum("amount_spent"))
-        total_expenditure_raw = aggregated_result["amount_spent__sum"]
-        total_expenditure = total_expenditure_raw or 0
-        total_expenditure = round(total_expenditure, 2)
+    }
+
+    # Products that have inventory, described by the row valid at month end.
+    products = (
+        Product.objects.annotate(
+            pieces=valid_inventory("total_pieces", OuterRef("pk"), last_day),
+            cost_price=valid_inventory(
+                "cost_price_per_piece", OuterRef("pk"), last_day
+            ),
+            selling_price=valid_inventory(
+                "selling_price_per_piece", OuterRef("pk"), last_day
+            ),
+        )
+        .filter(pieces__isnull=False)
+        .order_by("pk")
+    )
 
-        total_pieces = inventory.total_pieces
-        cost_price_per_piece = inventory.cost_price_per_piece
-        selling_price_per_piece = inventory.selling_price_per_piece
+    aggregated_result = Expenditure.objects.filter(
+        date__gte=start, date__lt=end
+    ).aggregate(Sum("amount_spent"))
+    total_expenditure = aggregated_result["amount_spent__sum"] or 0
+    total_expenditure = round(total_expenditure, 2)
 
-        sales = Sales.objects.filter(date__month=month, product=product).aggregate(
-            Sum("pieces_sold")
+    results = []
+    totals = dict.fromkeys(MONTHLY_TOTAL_FIELDS, 0)
+    for product in products:
+        pieces_sold_sum, total_selling_price, total_cost_price = sold.get(
+            product.pk, (0, Decimal("0.00"), Decimal("0.00"))
         )
-        pieces_sold_sum = sales["pieces_sold__sum"] or 0 
         if pieces_sold_sum == 0 and total_expenditure == 0:
             continue
-        total_pieces_sold_sum += pieces_sold_sum
-        total_selling_price = pieces_sold_sum * selling_price_per_piece
-        total_cost_price = pieces_sold_sum * cost_price_per_piece
-        total_profit = total_selling_price - total_cost_price
 
         result = {
             "year": year,
             "month": month,
             "product_name": product.name,
-            "pieces": total_pieces,
-            "cost_price_per_piece": cost_price_per_piece,
-            "selling_price_per_piece": selling_price_per_piece,
+            "pieces": product.pieces,
+            "cost_price_per_piece": product.cost_price,
+            "selling_price_per_piece": product.selling_price,
             "pieces_sold": pieces_sold_sum,
             "total_selling_price": total_selling_price,
             "total_cost_price": total_cost_price,
-            "profit": total_profit,
+            "profit": total_selling_price - total_cost_price,
         }
+        for field in MONTHLY_TOTAL_FIELDS:
+            totals[field] += result[field]
+        results.append(result)
 
-        results.append(result) 
-    if total_pieces_sold_sum == 0:
+    if totals["pieces_sold"] == 0:
         return None
-    total_result = {
-        "year": year,
-        "month": month,
-        "product_name": "all",
-        "pieces": sum(entry["pieces"] for entry in results),
-        "cost_price_per_piece": sum(entry["cost_price_per_piece"] for entry in results),
-        "selling_price_per_piece": sum(
-            entry["selling_price_per_piece"] for entry in results
-        ),
-        "pieces_sold": sum(entry["pieces_sold"] for entry in results),
-        "total_selling_price": sum(entry["total_selling_price"] for entry in results),
-        "total_cost_price": sum(entry["total_cost_price"] for entry in results),
-        "profit": sum(entry["profit"] for entry in results),
-        "total_expenditure":total_expenditure,
-        "actual_profit": sum(entry["profit"] for entry in results) - total_expenditure,
-    }
+
+    total_result = {"year": year, "month": month, "product_name": "all"}
+    total_result.update(totals)
+    total_result["total_expenditure"] = total_expenditure
+    total_result["actual_profit"] = totals["profit"] - total_expenditure
     results.append(total_result)
     return results
 
 
+RANGE_GROUPS = ("day", "week", "month", "product")
+RANGE_COLUMNS = [
+    "period",
+    "product_name",
+    *MONTHLY_TOTAL_FIELDS,
+    "total_expenditure",
+    "actual_profit",
+]
+
+
+def range_bucket(group, start):
+    # Expression grouping rows by bucket start date. Grouping by product
+    # puts the whole range in one bucket.
+    if group == "day":
+        return F("date")
+    if group == "week":
+        return TruncWeek("date")
+    if group == "month":
+        return TruncMonth("date")
+    return Value(start, output_field=DateField())
+
+
+def range_period(group, bucket, start, end):
+    """Return the label and last day of a bucket clipped to [start, end)."""
+    range_last_day = end - timedelta(days=1)
+    if group == "day":
+        return bucket.isoformat(), bucket
+    if group == "week":
+        return bucket.isoformat(), min(bucket + timedelta(days=6), range_last_day)
+    if group == "month":
+        last_day = month_bounds(bucket.month, bucket.year)[1] - timedelta(days=1)
+        return bucket.strftime("%Y-%m"), min(last_day, range_last_day)
+    return f"{start.isoformat()}/{range_last_day.isoformat()}", range_last_day
+
+
+def inventory_timeline(end):
+    """
+    Return {product_id: (name, dates, rows)} with each product's inventory
+    rows in (date, pk) order, enough to find the row valid on any day before
+    `end` the way valid_inventory does.
+    """
+    fields = (
+        "product",
+        "date",
+        "total_pieces",
+        "cost_price_per_piece",
+        "selling_price_per_piece",
+    )
+    timeline = {}
+    for product_id, day, *row in (
+        Inventory.objects.filter(date__lt=end)
+        .order_by("product", "date", "pk")
+        .values_list(*fields)
+    ):
+        timeline.setdefault(product_id, ([], []))
+        timeline[product_id][0].append(day)
+        timeline[product_id][1].append(row)
+    # Products first stocked after the range fall back to their earliest row.
+    for product_id, day, *row in (
+        Inventory.objects.filter(date__gte=end)
+        .exclude(product__in=Inventory.objects.filter(date__lt=end).values("product"))
+        .order_by("product", "date", "pk")
+        .values_list(*fields)
+    ):
+        timeline.setdefault(product_id, ([day], [row]))
+    catalog = get_catalog(timeline)
+    return {
+        product_id: (catalog.name(product_id), *timeline[product_id])
+        for product_id in sorted(timeline)
+    }
+
+
+def calculate_profit_for_range(start, end, group="month"):
+    """
+    Profit for the half-open range [start, end) split into day, week or
+    month buckets, or one bucket per product. Rows have the monthly report
+    shape with a "period" label instead of year and month, and every bucket
+    ends with an "all" row charged with that bucket's expenditure. Buckets
+    without sales are left out; returns None if there are none.
+
+    Runs a fixed number of grouped queries however many buckets there are.
+    """
+    if group not in RANGE_GROUPS:
+        raise ValueError(f"Unsupported grouping {group!r}.")
+    bucket = range_bucket(group, start)
+
+    sold = defaultdict(dict)
+    for row in (
+        DailyProductSummary.objects.filter(date__gte=start, date__lt=end)
+        .order_by()
+        .annotate(bucket=bucket)
+        .values("bucket", "product")
+        .annotate(
+            pieces_sold_sum=Sum("pieces_sold"),
+            revenue_sum=Sum("revenue"),
+            cost_sum=Sum("cost"),
+        )
+    ):
+        sold[row["bucket"]][row["product"]] = (
+            row["pieces_sold_sum"],
+            row["revenue_sum"],
+            row["cost_sum"],
+        )
+
+    expenditures = {
+        row["bucket"]: round(row["amount_spent_sum"], 2)
+        for row in Expenditure.objects.filter(date__gte=start, date__lt=end)
+        .order_by()
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(amount_spent_sum=Sum("amount_spent"))
+    }
+
+    timeline = inventory_timeline(end)
+
+    results = []
+    for bucket_start in sorted(sold):
+        period, last_day = range_period(group, bucket_start, start, end)
+        total_expenditure = expenditures.get(bucket_start, 0)
+        bucket_rows = []
+        totals = dict.fromkeys(MONTHLY_TOTAL_FIELDS, 0)
+        for product_id, (name, dates, rows) in timeline.items():
+            pieces_sold_sum, total_selling_price, total_cost_price = sold[
+                bucket_start
+            ].get(product_id, (0, Decimal("0.00"), Decimal("0.00")))
+            if pieces_sold_sum == 0 and total_expenditure == 0:
+                continue
+            # The latest row on or before the bucket's last day, else the
+            # earliest one.
+            pieces, cost_price, selling_price = rows[
+                max(bisect_right(dates, last_day) - 1, 0)
+            ]
+            result = {
+                "period": period,
+                "product_name": name,
+                "pieces": pieces,
+                "cost_price_per_piece": cost_price,
+                "selling_price_per_piece": selling_price,
+                "pieces_sold": pieces_sold_sum,
+                "total_selling_price": total_selling_price,
+                "total_cost_price": total_cost_price,
+                "profit": total_selling_price - total_cost_price,
+            }
+            for field in MONTHLY_TOTAL_FIELDS:
+                totals[field] += result[field]
+            bucket_rows.append(result)
+
+        if totals["pieces_sold"] == 0:
+            continue
+        total_result = {"period": period, "product_name": "all"}
+        total_result.update(totals)
+        total_result["total_expenditure"] = total_expenditure
+        total_result["actual_profit"] = totals["profit"] - total_expenditure
+        results.extend(bucket_rows)
+        results.append(total_result)
+
+    return results or None
+
+
 def home(request):
     return render(request, "home.html")
 
 
+def save_report(results, columns, key, export_format):
+    with phase("export"):
+        report = export_report(results, columns, export_format)
+    with report, phase("upload"):
+        return get_report_store().save(report, key)
+
+
+def report_download_url(key):
+    with phase("presign"):
+        return get_report_store().download_url(key)
+
+
+def profit_functions():
+    # The (daily, monthly) profit functions selected by REPORT_ENGINE.
+    if getattr(settings, "REPORT_ENGINE", "python") == "numpy":
+        from . import vectorized
+
+        return (
+            vectorized.calculate_daily_profit,
+            vectorized.calculate_actual_profit_for_month,
+        )
+    return calculate_daily_profit, calculate_actual_profit_for_month
+
+
+def daily_report_key(date, export_format):
+    return f"{REPORT_FOLDER_DAILY}daily_report_{date}.{export_format}"
+
+
+def monthly_report_key(month, year, export_format):
+    return f"{REPORT_FOLDER_MONTHLY}monthly_report_{month}_{year}.{export_format}"
+
+
+def generated_report_key(kind, period, export_format, fingerprint):
+    # A report some other process already built from the same data.
+    return (
+        GeneratedReport.objects.filter(
+            kind=kind,
+            period=period,
+            export_format=export_format,
+            fingerprint=fingerprint,
+        )
+        .values_list("report_key", flat=True)
+        .first()
+    )
+
+
+def record_generated_report(kind, period, export_format, fingerprint, key):
+    GeneratedReport.objects.update_or_create(
+        kind=kind,
+        period=period,
+        export_format=export_format,
+        defaults={"fingerprint": fingerprint, "report_key": key},
+    )
+
+
+def build_report(kind, period, export_format, fingerprint, calculate, columns, key):
+    # Return the store key of an up to date report, building and saving it
+    # only when the underlying rows changed since the last build.
+    cache_kind = f"{kind}.{export_format}"
+    cached = report_cache.get(cache_kind, period, fingerprint)
+    if cached is not None:
+        return cached
+    stored = generated_report_key(kind, period, export_format, fingerprint)
+    if stored is not None:
+        report_cache.set(cache_kind, period, fingerprint, stored)
+        return stored
+
+    with phase("aggregate"):
+        results = calculate()
+    if results is None:
+        return None
+    if save_report(results, columns, key, export_format):
+        record_generated_report(kind, period, export_format, fingerprint, key)
+        report_cache.set(cache_kind, period, fingerprint, key)
+    return key
+
+
+def build_daily_report(date, export_format="xlsx"):
+    with phase("fingerprint"):
+        fingerprint = daily_fingerprint(date)
+    return build_report(
+        "daily",
+        date.isoformat(),
+        export_format,
+        fingerprint,
+        lambda: profit_functions()[0](date),
+        DAILY_COLUMNS,
+        daily_report_key(date, export_format),
+    )
+
+
+def build_monthly_report(month, year, export_format="xlsx"):
+    start, end = month_bounds(month, year)
+    with phase("fingerprint"):
+        fingerprint = monthly_fingerprint(start, end)
+    return build_report(
+        "monthly",
+        f"{year}-{month:02d}",
+        export_format,
+        fingerprint,
+        lambda: profit_functions()[1](month, year),
+        MONTHLY_COLUMNS,
+        monthly_report_key(month, year, export_format),
+    )
+
+
 @api_view(["POST", "GET"])
 def generate_daily_profit(request):
     if request.method == "POST":
         try:
             date_str = request.POST.get("date")
             date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            filename = f"daily_report_{date}.xlsx"
-            s3_key = f"{S3_FOLDER_DAILY}{filename}"
-
-            # Check if the file exists in S3
-            try:
-                s3_client.head_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=s3_key)
-                logger.info(f"{filename}.xlsx already exists")
-                presigned_url = generate_presigned_url(s3_key)
-                if presigned_url is not None:
-                    return render(
-                        request,
-                        "daily_sales.html",
-                        {"success": True, "presigned_url": presigned_url},
-                    )
-                else:
-                    return JsonResponse({"msg": "unable to generate presigned url"})
-            except:
-                results = calculate_daily_profit(date)
-                if results is None:
-                    return JsonResponse({"message": f"Daily report not found  for {date}"})
-                else:
-                    excel_file_path = generate_excel_file(results, filename)
-                    upload_to_s3(excel_file_path, S3_FOLDER_DAILY, f"{filename}")
-                    presigned_url = generate_presigned_url(s3_key)
-                    if presigned_url is not None:
-                        return render(
-                            request,
-                            "daily_sales.html",
-                            {"success": True, "presigned_url": presigned_url},
-                        )
-                    else:
-                        return JsonResponse({"msg": "unable to generate presigned url"})
+            export_format = request.POST.get("format", "xlsx")
+            if export_format not in EXPORT_FORMATS:
+                return JsonResponse(
+                    {"success": False, "msg": f"Unsupported format {export_format}."}
+                )
+            if getattr(settings, "REPORT_JOBS_ASYNC", False):
+                job = enqueue_report("daily", date.isoformat(), export_format)
+                return JsonResponse(job_payload(job), status=202)
+            key = build_daily_report(date, export_format)
+            if key is None:
+                return JsonResponse({"message": f"Daily report not found  for {date}"})
+            download_url = report_download_url(key)
+            if download_url is not None:
+                return render(
+                    request,
+                    "daily_sales.html",
+                    {"success": True, "download_url": download_url},
+                )
+            else:
+                return JsonResponse({"msg": "unable to generate download url"})
         except ValueError:
             logger.exception("Error in daily_sales: Invalid date format")
             return JsonResponse(
@@ -232,7 +550,11 @@ def generate_daily_profit(request):
                 }
             )
 
-    return render(request, "daily_sales.html", {"filename": ""})
+    return render(
+        request,
+        "daily_sales.html",
+        {"filename": "", "async_jobs": getattr(settings, "REPORT_JOBS_ASYNC", False)},
+    )
 
 
 @api_view(["POST", "GET"])
@@ -241,39 +563,29 @@ def generate_monthly_profit(request):
         try:
             month = int(request.POST.get("month"))
             year = int(request.POST.get("year"))
-            filename = f"monthly_report_{month}_{year}.xlsx"
-            s3_key = f"{S3_FOLDER_MONTHLY}{filename}"
-            # Check if the file exists in S3
-            try:
-                s3_client.head_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=s3_key)
-                logger.info(f"{filename}.xlsx already exists")
-                presigned_url = generate_presigned_url(s3_key)
-                if presigned_url is not None:
-                    return render(
-                        request,
-                        "monthly_sales.html",
-                        {"success": True, "presigned_url": presigned_url},
-                    )
-                else:
-                    return JsonResponse({"msg": "unable to generate presigned url"})
-            except:
-                results = calculate_actual_profit_for_month(month, year)
-                if results is None:
-                    return JsonResponse(
-                        {"message": f"Monthly report not found for {month}_{year}"}
-                    )
-                else:
-                    excel_file_path = generate_excel_file(results, filename)
-                    upload_to_s3(excel_file_path, S3_FOLDER_MONTHLY, f"{filename}")
-                    presigned_url = generate_presigned_url(s3_key)
-                    if presigned_url is not None:
-                        return render(
-                            request,
-                            "monthly_sales.html",
-                            {"success": True, "presigned_url": presigned_url},
-                        )
-                    else:
-                        return JsonResponse({"msg": "unable to generate presigned url"})
+            export_format = request.POST.get("format", "xlsx")
+            if export_format not in EXPORT_FORMATS:
+                return JsonResponse(
+                    {"success": False, "msg": f"Unsupported format {export_format}."}
+                )
+            if getattr(settings, "REPORT_JOBS_ASYNC", False):
+                period = f"{year}-{month:02d}"
+                job = enqueue_report("monthly", period, export_format)
+                return JsonResponse(job_payload(job), status=202)
+            key = build_monthly_report(month, year, export_format)
+            if key is None:
+                return JsonResponse(
+                    {"message": f"Monthly report not found for {month}_{year}"}
+                )
+            download_url = report_download_url(key)
+            if download_url is not None:
+                return render(
+                    request,
+                    "monthly_sales.html",
+                    {"success": True, "download_url": download_url},
+                )
+            else:
+                return JsonResponse({"msg": "unable to generate download url"})
         except ValueError:
             logger.exception("Error in monthly_sales: Invalid month or year format")
             return JsonResponse(
@@ -288,60 +600,384 @@ def generate_monthly_profit(request):
                 }
             )
 
-    return render(request, "monthly_sales.html")
+    return render(
+        request,
+        "monthly_sales.html",
+        {"async_jobs": getattr(settings, "REPORT_JOBS_ASYNC", False)},
+    )
 
 def reports(request):
     return render(request,'reports.html')
 
-def download_excel(request):
-    presigned_url = unquote(request.GET.get("presigned_url", ""))
 
+def report_data_request(request, kind):
+    """
+    Parse the period a report data request asks for and look up the version
+    of its data: (period, fingerprint), or None if the query is invalid.
+    Computed once per request and shared by the ETag check and the view.
+    """
+    if not hasattr(request, "_report_data"):
+        request._report_data = None
+        try:
+            if kind == "daily":
+                date_str = request.GET.get("date", "")
+                period = datetime.strptime(date_str, "%Y-%m-%d").date()
+                fingerprint = daily_fingerprint(period)
+            else:
+                period = (int(request.GET.get("month")), int(request.GET.get("year")))
+                start, end = month_bounds(*period)
+                fingerprint = monthly_fingerprint(start, end)
+        except (TypeError, ValueError):
+            return None
+        request._report_data = (period, fingerprint)
+    return request._report_data
+
+
+def report_data_etag(kind):
+    def etag(request):
+        data = report_data_request(request, kind)
+        return f"{kind}-{data[1]}" if data else None
+
+    return etag
+
+
+def report_data_response(request, kind, calculate, period_label):
+    # Rows are cached by fingerprint like report files, so clients without
+    # a cached copy don't recompute unchanged data either.
+    data = report_data_request(request, kind)
+    if data is None:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid or missing report period."}, status=400
+        )
+    period, fingerprint = data
+    label = period_label(period)
+    rows = report_cache.get(f"{kind}.json", label, fingerprint)
+    if rows is None:
+        with phase("aggregate"):
+            rows = calculate(period) or []
+        report_cache.set(f"{kind}.json", label, fingerprint, rows)
+    if not rows:
+        return JsonResponse(
+            {"success": False, "msg": f"No {kind} report data for {label}."},
+            status=404,
+        )
+    return JsonResponse({"success": True, "period": label, "rows": rows})
+
+
+# No Last-Modified: a report also reads expenses, prices and product names,
+# and deletions would move it backwards. The ETag covers all of them.
+@gzip_page
+@require_GET
+@condition(etag_func=report_data_etag("daily"))
+def daily_profit_data(request):
+    """The daily report rows as JSON, for ?date=YYYY-MM-DD."""
+    return report_data_response(
+        request, "daily", calculate_daily_profit, lambda day: day.isoformat()
+    )
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=report_data_etag("monthly"))
+def monthly_profit_data(request):
+    """The monthly report rows as JSON, for ?month=M&year=YYYY."""
+    return report_data_response(
+        request,
+        "monthly",
+        lambda period: calculate_actual_profit_for_month(*period),
+        lambda period: f"{period[1]}-{period[0]:02d}",
+    )
+
+
+def job_payload(job):
+    payload = {
+        "success": job.status != ReportJob.FAILED,
+        "job_id": job.pk,
+        "kind": job.kind,
+        "period": job.period,
+        "format": job.export_format,
+        "status": job.status,
+        "progress": job.progress,
+        "status_url": reverse("sales:report_job_status", args=[job.pk]),
+    }
+    if job.status == ReportJob.DONE:
+        payload["download_url"] = report_download_url(job.report_key)
+    if job.error:
+        payload["error"] = job.error
+    return payload
+
+
+def report_job_status(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse(job_payload(job))
+
+
+INGEST_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/jsonl": "jsonl",
+    "application/x-ndjson": "jsonl",
+}
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def ingest_sales(request):
+    """
+    Bulk import sales from a CSV or JSON lines body, or from an uploaded
+    "file". The format comes from the content type or the file extension.
+    """
+    content_type = request.content_type.split(";")[0].strip()
+    if content_type == "multipart/form-data":
+        stream = request.FILES.get("file")
+        name = stream.name if stream is not None else ""
+        ingest_format = os.path.splitext(name)[1].lstrip(".").lower()
+    else:
+        # Read the body as it arrives rather than through a DRF parser.
+        stream = request.stream
+        ingest_format = INGEST_CONTENT_TYPES.get(content_type)
+    if stream is None or ingest_format not in INGEST_FORMATS:
+        return JsonResponse(
+            {"success": False, "msg": "Send a CSV or JSON lines file."}, status=400
+        )
+    try:
+        batch_size = int(request.query_params.get("batch_size", DEFAULT_BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "batch_size must be a positive integer."},
+            status=400,
+        )
+    try:
+        batches = list(import_sales(read_rows(stream, ingest_format), batch_size))
+    except (csv.Error, UnicodeDecodeError) as e:
+        return JsonResponse({"success": False, "msg": str(e)}, status=400)
+    return JsonResponse(
+        {
+            "success": True,
+            "inserted": sum(batch["inserted"] for batch in batches),
+            "rejected": sum(len(batch["errors"]) for batch in batches),
+            "batches": batches,
+        }
+    )
+
+
+def profit_range(request):
+    """
+    JSON profit for ?start=YYYY-MM-DD&end=YYYY-MM-DD (both inclusive),
+    grouped by ?group=day|week|month|product.
+    """
+    try:
+        start = datetime.strptime(request.GET.get("start", ""), "%Y-%m-%d").date()
+        end = datetime.strptime(request.GET.get("end", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid date format. Please use YYYY-MM-DD."},
+            status=400,
+        )
+    group = request.GET.get("group", "month")
+    if group not in RANGE_GROUPS:
+        return JsonResponse(
+            {"success": False, "msg": f"Unsupported grouping {group}."}, status=400
+        )
+    if end < start:
+        return JsonResponse(
+            {"success": False, "msg": "end must not be before start."}, status=400
+        )
+    results = calculate_profit_for_range(start, end + timedelta(days=1), group)
+    if results is None:
+        return JsonResponse(
+            {"success": False, "msg": f"No sales between {start} and {end}."},
+            status=404,
+        )
+    return JsonResponse({"success": True, "group": group, "rows": results})
+
+
+def stock_product(catalog, value):
+    # ?product takes a product id or name; None when it matches no product.
+    if value.isdigit():
+        product_id = int(value)
+        return product_id if product_id in catalog else None
+    return catalog.ids_by_name.get(value)
+
+
+def stock_day(request):
+    value = request.GET.get("date")
+    if value is None:
+        return timezone.localdate()
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def stock_level(request):
+    """JSON stock of ?product=<id or name> on ?date=YYYY-MM-DD (today by default)."""
     try:
-        # Parse the presigned URL
-        parsed_url = urlparse(presigned_url)
+        day = stock_day(request)
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid date format. Please use YYYY-MM-DD."},
+            status=400,
+        )
+    value = request.GET.get("product", "")
+    catalog = get_catalog([int(value)] if value.isdigit() else ())
+    product_id = stock_product(catalog, value)
+    if product_id is None:
+        return JsonResponse({"success": False, "msg": "Unknown product."}, status=404)
+    stocked, sold, remaining = stock.stock_level(product_id, day)
+    return JsonResponse(
+        {
+            "success": True,
+            "date": day,
+            "product": catalog.name(product_id),
+            "stocked": stocked,
+            "sold": sold,
+            "remaining": remaining,
+        }
+    )
 
-        # Extract and decode query parameters
-        query_params = dict(qp.split("=", 1) for qp in parsed_url.query.split("&"))
-        decoded_query_params = {k: unquote(v) for k, v in query_params.items()}
 
-        # Reconstruct the URL with decoded query parameters
-        decoded_presigned_url = urlunparse(
-            parsed_url._replace(query=urlencode(decoded_query_params))
+def low_stock(request):
+    """
+    JSON list of the products with at most ?threshold pieces left on
+    ?date=YYYY-MM-DD (today by default), lowest first.
+    """
+    try:
+        day = stock_day(request)
+        threshold = int(
+            request.GET.get("threshold", getattr(settings, "STOCK_LOW_THRESHOLD", 10))
         )
-        print("Decoded Presigned URL:", decoded_presigned_url)
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "msg": "Invalid date or threshold."}, status=400
+        )
+    rows = product_names(stock.low_stock(day, threshold))
+    return JsonResponse(
+        {
+            "success": True,
+            "date": day,
+            "threshold": threshold,
+            "rows": [
+                {"product": name, "stocked": stocked, "sold": sold, "remaining": left}
+                for name, stocked, sold, left in rows
+            ],
+        }
+    )
+
+
+def report_file(request, key):
+    # Serves reports kept by the local and in-memory stores.
+    report = get_report_store().open(key)
+    if report is None:
+        raise Http404(f"Report {key} not found")
+    return FileResponse(report, as_attachment=True, filename=os.path.basename(key))
+
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# (connect, read) timeouts in seconds for fetching reports from the store.
+DOWNLOAD_TIMEOUT = (5, 30)
+# Upstream headers forwarded on proxied downloads.
+DOWNLOAD_HEADERS = (
+    "Content-Length",
+    "Content-Range",
+    "Accept-Ranges",
+    "ETag",
+    "Last-Modified",
+)
+
+_download_session = None
+
+
+def get_download_session():
+    # One pooled session per process, so repeated downloads reuse open
+    # connections to the store instead of a new TCP/TLS handshake each time.
+    global _download_session
+    if _download_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _download_session = session
+    return _download_session
+
+
+def stream_download(upstream):
+    try:
+        yield from upstream.iter_content(DOWNLOAD_CHUNK_SIZE)
+    finally:
+        upstream.close()
+
+
+def decode_presigned_url(presigned_url):
+    """
+    Return (URL to fetch, parsed original URL) for a presigned URL passed to
+    the download proxy, with its query parameters decoded.
+    """
+    parsed_url = urlparse(presigned_url)
+    query_params = dict(qp.split("=", 1) for qp in parsed_url.query.split("&"))
+    decoded_query_params = {k: unquote(v) for k, v in query_params.items()}
+    decoded_presigned_url = urlunparse(
+        parsed_url._replace(query=urlencode(decoded_query_params))
+    )
+    return decoded_presigned_url, parsed_url
+
+
+def copy_download_headers(upstream_headers, response, parsed_url):
+    for header in DOWNLOAD_HEADERS:
+        # The HTTP clients transparently decode compressed bodies, so the
+        # upstream length only holds for identity encoded ones.
+        encoded = "Content-Encoding" in upstream_headers
+        if header == "Content-Length" and encoded:
+            continue
+        if header in upstream_headers:
+            response[header] = upstream_headers[header]
+    filename = os.path.basename(parsed_url.path) or "downloaded_file.xlsx"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
 
-        response = requests.get(decoded_presigned_url)
 
-        if response.status_code == 200:
-            # Set the content type and headers for the response
-            content_type = response.headers.get(
+def download_excel(request):
+    presigned_url = unquote(request.GET.get("presigned_url", ""))
+
+    try:
+        decoded_presigned_url, parsed_url = decode_presigned_url(presigned_url)
+        if not get_report_store().serves_url(decoded_presigned_url):
+            return HttpResponse("Not a report download URL.", status=400)
+
+        if getattr(settings, "REPORT_DOWNLOAD_REDIRECT", False):
+            return HttpResponseRedirect(decoded_presigned_url)
+
+        headers = {}
+        if "HTTP_RANGE" in request.META:
+            headers["Range"] = request.META["HTTP_RANGE"]
+        upstream = get_download_session().get(
+            decoded_presigned_url,
+            headers=headers,
+            stream=True,
+            timeout=DOWNLOAD_TIMEOUT,
+        )
+
+        if upstream.status_code in (200, 206):
+            content_type = upstream.headers.get(
                 "Content-Type", "application/octet-stream"
             )
-            content_disposition = 'attachment; filename="downloaded_file.xlsx"'
-
-            # Create an HttpResponse with the file content
-            response = HttpResponse(response.content, content_type=content_type)
-            response["Content-Disposition"] = content_disposition
+            response = StreamingHttpResponse(
+                stream_download(upstream),
+                status=upstream.status_code,
+                content_type=content_type,
+            )
+            copy_download_headers(upstream.headers, response, parsed_url)
             return response
         else:
-            print("Error Response Content:", response.content)
-            print("Error Response Headers:", response.headers)
+            logger.error(
+                "Error downloading report: status %s, headers %s",
+                upstream.status_code,
+                upstream.headers,
+            )
+            upstream.close()
             return HttpResponse(
-                f"Error downloading file. Status code: {response.status_code}",
+                f"Error downloading file. Status code: {upstream.status_code}",
                 status=500,
             )
     except Exception as e:
         return HttpResponse(f"Error downloading file: {str(e)}", status=500)
-
-
-def generate_presigned_url(s3_key):
-    try:
-        presigned_url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": AWS_STORAGE_BUCKET_NAME, "Key": s3_key},
-            ExpiresIn=3600,  # Set the expiration time (in seconds)
-        )
-        return presigned_url
-    except Exception as e:
-        logger.error(f"Error generating presigned URL for {s3_key}: {e}")
-        return None